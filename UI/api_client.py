@@ -1,46 +1,237 @@
+import asyncio
+import concurrent.futures
+import time
+
 import requests
-import json
+import numpy as np
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+# Raw little-endian embedding rows understood by /predict and /predict_batch
+BINARY_MEDIA_TYPE = "application/octet-stream"
+WIRE_DTYPES = {"float32": "<f4", "float16": "<f2"}
+
+# (connect, read) timeout mặc định theo endpoint, tính bằng giây
+TIMEOUTS = {
+    "default": (3.05, 10),
+    "predict": (3.05, 5),
+    "recognizer": (3.05, 60),
+    "load_model": (3.05, 60),
+    "save_data": (3.05, 120),
+    "save_log": (3.05, 30),
+}
+RETRY_STATUS = (502, 503, 504)
+
+
+def _not_sent(error):
+    """True khi request chắc chắn chưa tới server (không kết nối được) -> retry an toàn cả với POST ghi dữ liệu."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
 
 class APIClient:
-    """Client for calling remote face recognition API"""
-    def __init__(self, base_url, api_key=None):
+    """
+    Client for calling remote face recognition API.
+    All calls share one keep-alive requests.Session (connection pool of `pool_size`), carry
+    `headers` and a per-endpoint timeout, and are retried up to `retries` times with exponential
+    backoff. Read-only calls are retried on connection errors, timeouts and 502/503/504; calls that
+    write data (save_*) only when the connection could not be opened, so nothing is stored twice
+    (push_log with an idempotency key is deduplicated by the server and retried like a read).
+    """
+    def __init__(self, base_url, api_key=None, binary=True, wire_dtype="float32",
+                 pool_size=4, retries=2, backoff_s=0.2, timeouts=None):
+        '''
+        Args:
+            base_url (str): Địa chỉ API.
+            api_key (str): Gửi kèm header Authorization: Bearer <api_key>.
+            binary (bool): Gửi embedding dạng nhị phân (False = JSON).
+            wire_dtype (str): "float32" hoặc "float16" cho embedding nhị phân.
+            pool_size (int): Số kết nối keep-alive tối đa giữ trong pool.
+            retries (int): Số lần thử lại tối đa mỗi request.
+            backoff_s (float): Thời gian chờ trước lần thử lại đầu tiên, gấp đôi sau mỗi lần.
+            timeouts (dict): Ghi đè TIMEOUTS theo endpoint.
+        '''
         self.base_url = base_url.rstrip('/')
         self.api_key = api_key
         self.headers = {'Authorization': f'Bearer {self.api_key}'} if self.api_key else {}
+        # binary=False (hoặc server cũ không hỗ trợ) thì gửi embedding dạng JSON
+        self.binary = binary
+        self.wire_dtype = wire_dtype
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.timeouts = dict(TIMEOUTS, **(timeouts or {}))
+
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
 
-    def load_model(self):
-        url = f"{self.base_url}/load_model"
-        response = requests.post(url)
+    def __exit__(self, *exc):
+        self.close()
+
+    def _request(self, method, endpoint, idempotent=True, timeout=None, retries=None, **kwargs):
+        url = f"{self.base_url}/{endpoint}"
+        timeout = timeout or self.timeouts.get(endpoint, self.timeouts["default"])
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            last = attempt == retries
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last or not (idempotent or _not_sent(e)):
+                    raise
+            else:
+                if last or not idempotent or response.status_code not in RETRY_STATUS:
+                    return response
+            time.sleep(self.backoff_s * 2 ** attempt)
+
+    def load_model(self, timeout=None):
+        response = self._request("POST", "load_model", timeout=timeout)
         response.raise_for_status()
 
-    def load_json_data(self):
-        url = f"{self.base_url}/load_json_data"
-        response = requests.get(url)
+    def load_json_data(self, timeout=None):
+        response = self._request("GET", "load_json_data", timeout=timeout)
         response.raise_for_status()
         return response.json()
 
-    def push_json_data(self, json_data):
-        url = f"{self.base_url}/save_json"
-        response = requests.post(url, json=json_data)
+    def push_json_data(self, json_data, timeout=None):
+        response = self._request("POST", "save_json", idempotent=False, timeout=timeout, json=json_data)
         response.raise_for_status()
 
-    def push_data(self, data):
+    def push_data(self, data, timeout=None):
         try:
-            resp = requests.post(f"{self.base_url}/save_data", json=data.to_dict(orient="list"))
+            resp = self._request("POST", "save_data", idempotent=False, timeout=timeout,
+                                 json=data.to_dict(orient="list"))
             resp.raise_for_status()
             return resp.json()   # chứa message + rows_before/after
         except requests.HTTPError as err:
             print("Push failed:", resp.status_code, resp.text)
             raise err
 
-    def push_log(self, log_data):
-        url = f"{self.base_url}/save_log"
-        response = requests.post(url, json=log_data.to_dict(orient="list"))
+    def push_log(self, log_data, timeout=None, idempotency_key=None, retries=None):
+        # Có Idempotency-Key thì server bỏ qua batch trùng -> retry an toàn như request chỉ đọc
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        response = self._request("POST", "save_log", idempotent=idempotency_key is not None, timeout=timeout,
+                                 retries=retries, json=log_data.to_dict(orient="list"), headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    def load_recognizer(self, version=None, timeout=None):
+        """Tải bundle recognizer + students.json (GET /recognizer).
+        Returns (version, npz bytes), or (version, None) when `version` is still current (304)."""
+        headers = {"If-None-Match": f'"{version}"'} if version else None
+        response = self._request("GET", "recognizer", timeout=timeout, headers=headers)
+        if response.status_code == 304:
+            return version, None
         response.raise_for_status()
+        return response.headers["X-Recognizer-Version"], response.content
+
+    def encode_embeddings(self, vec_embeddings):
+        return np.ascontiguousarray(vec_embeddings, dtype=WIRE_DTYPES[self.wire_dtype]).tobytes()
 
-    def predict(self, vec_embedding):
-        url = f"{self.base_url}/predict"
-        files = {"embedding": vec_embedding.tolist()}
-        response = requests.post(url, json=files)
+    def _post_embeddings(self, endpoint, vec_embeddings, json_payload, timeout=None):
+        rejected = None
+        if self.binary:
+            headers = {"Content-Type": BINARY_MEDIA_TYPE, "X-Embedding-Dtype": self.wire_dtype}
+            response = self._request("POST", endpoint, timeout=timeout,
+                                     data=self.encode_embeddings(vec_embeddings), headers=headers)
+            if response.status_code not in (415, 422):
+                response.raise_for_status()
+                return response
+            if response.status_code == 415:
+                # Server không hỗ trợ định dạng nhị phân -> chuyển hẳn sang JSON
+                self.binary = False
+            rejected = response.status_code
+        response = self._request("POST", endpoint, timeout=timeout, json=json_payload())
         response.raise_for_status()
-        return response
\ No newline at end of file
+        if rejected == 422:
+            # Cùng dữ liệu dạng JSON thì được nhận -> server cũ chỉ hiểu JSON, không thử nhị phân nữa.
+            # Body nhị phân hỏng (sai độ dài, NaN) thì bản JSON cũng lỗi và không tới được đây.
+            self.binary = False
+        return response
+
+    def predict(self, vec_embedding, timeout=None):
+        return self._post_embeddings("predict", vec_embedding, lambda: {"embedding": vec_embedding.tolist()},
+                                     timeout or self.timeouts["predict"])
+
+    def predict_batch(self, vec_embeddings, timeout=None):
+        return self._post_embeddings("predict_batch", vec_embeddings,
+                                     lambda: {"embeddings": [vec.tolist() for vec in vec_embeddings]},
+                                     timeout or self.timeouts["predict"])
+
+    # Cùng giao diện với LocalRecognizer: trả về kết quả đã decode
+    def predict_embedding(self, vec_embedding):
+        return self.predict(vec_embedding).json()
+
+    def predict_embeddings(self, vec_embeddings):
+        return self.predict_batch(vec_embeddings).json()["predictions"]
+
+
+class AsyncAPIClient:
+    """
+    asyncio front-end of APIClient for issuing several calls concurrently, e.g.
+        responses = await asyncio.gather(*(client.predict(e) for e in embeddings))
+    Calls run on a thread pool the size of the connection pool and share its keep-alive
+    connections, timeouts and retries; no extra HTTP dependency is needed.
+    """
+    def __init__(self, base_url=None, client=None, **kwargs):
+        '''
+        Args:
+            base_url (str): Địa chỉ API (khi không truyền `client`).
+            client (APIClient): Client đồng bộ dùng chung (vd. với phần còn lại của UI).
+            **kwargs: Tham số của APIClient khi tạo mới.
+        '''
+        self._owns_client = client is None
+        self.client = client or APIClient(base_url, **kwargs)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.client.pool_size,
+                                                               thread_name_prefix="api-client")
+
+    async def _call(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: fn(*args, **kwargs))
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+        if self._owns_client:
+            self.client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def load_model(self, timeout=None):
+        return await self._call(self.client.load_model, timeout=timeout)
+
+    async def load_json_data(self, timeout=None):
+        return await self._call(self.client.load_json_data, timeout=timeout)
+
+    async def push_json_data(self, json_data, timeout=None):
+        return await self._call(self.client.push_json_data, json_data, timeout=timeout)
+
+    async def push_data(self, data, timeout=None):
+        return await self._call(self.client.push_data, data, timeout=timeout)
+
+    async def push_log(self, log_data, timeout=None, idempotency_key=None, retries=None):
+        return await self._call(self.client.push_log, log_data, timeout=timeout, idempotency_key=idempotency_key,
+                                retries=retries)
+
+    async def predict(self, vec_embedding, timeout=None):
+        return await self._call(self.client.predict, vec_embedding, timeout=timeout)
+
+    async def load_recognizer(self, version=None, timeout=None):
+        return await self._call(self.client.load_recognizer, version, timeout=timeout)
+
+    async def predict_batch(self, vec_embeddings, timeout=None):
+        return await self._call(self.client.predict_batch, vec_embeddings, timeout=timeout)
@@ -0,0 +1,201 @@
+"""
+Write-ahead attendance journal of the kiosk.
+
+Every confirmation is one INSERT into an SQLite database in WAL mode (O(1), durable once the call
+returns), so a crash loses nothing. A JournalUploader thread sends the unsent events to /save_log
+in batches every few seconds. Each batch is sealed with an idempotency key
+("<journal id>-<first seq>-<last seq>") before it is sent and is resent with the same key until the
+server acknowledges it, so a retry after a lost response never logs an event twice. Acknowledged
+events are deleted, so the journal only holds what the server has not stored yet.
+"""
+import sqlite3
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+LOG_COLUMNS = ["student_id", "student_name", "timestamp", "status"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT NOT NULL,
+    student_name TEXT,
+    timestamp TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    batch TEXT
+);
+CREATE INDEX IF NOT EXISTS events_batch ON events (batch);
+"""
+
+
+class AttendanceJournal:
+    def __init__(self, path="attendance_journal.db"):
+        '''
+        Args:
+            path (str): File SQLite chứa journal (tạo mới nếu chưa có).
+        '''
+        self.path = path
+        self._lock = threading.Lock()  # một connection dùng chung giữa GUI và luồng upload
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'journal_id'").fetchone()
+        if row is None:
+            # Phân biệt key của các kiosk / journal khác nhau trên server
+            self.journal_id = uuid.uuid4().hex
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('journal_id', ?)", (self.journal_id,))
+        else:
+            self.journal_id = row[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def append(self, entry):
+        """Appends one attendance event {student_id, student_name, timestamp, status}; returns its seq."""
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO events (student_id, student_name, timestamp, status) VALUES (?, ?, ?, ?)",
+                (str(entry["student_id"]), entry["student_name"], entry["timestamp"], int(entry["status"])),
+            )
+            return cur.lastrowid
+
+    def pending_count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def next_batch(self, max_rows=500):
+        """
+        Returns (key, DataFrame) of the next batch to upload, or (None, None) if everything was sent.
+        A batch that was sealed but not acknowledged is returned again, unchanged and with the same key.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT batch FROM events WHERE batch IS NOT NULL "
+                                         "ORDER BY seq LIMIT 1").fetchone()
+                if row is not None:
+                    key = row[0]
+                else:
+                    seqs = [r[0] for r in self._conn.execute(
+                        "SELECT seq FROM events ORDER BY seq LIMIT ?", (max_rows,))]
+                    if not seqs:
+                        self._conn.execute("COMMIT")
+                        return None, None
+                    key = f"{self.journal_id}-{seqs[0]}-{seqs[-1]}"
+                    self._conn.execute("UPDATE events SET batch = ? WHERE seq BETWEEN ? AND ?",
+                                       (key, seqs[0], seqs[-1]))
+                rows = self._conn.execute(f"SELECT {', '.join(LOG_COLUMNS)} FROM events WHERE batch = ? ORDER BY seq",
+                                          (key,)).fetchall()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return key, pd.DataFrame(rows, columns=LOG_COLUMNS)
+
+    def mark_sent(self, key):
+        """Server đã lưu batch `key` -> xoá khỏi journal."""
+        with self._lock:
+            self._conn.execute("DELETE FROM events WHERE batch = ?", (key,))
+
+    def read_frame(self):
+        """The events that are not uploaded yet, in order."""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(LOG_COLUMNS)} FROM events ORDER BY seq").fetchall()
+        return pd.DataFrame(rows, columns=LOG_COLUMNS)
+
+
+class JournalUploader:
+    """
+    Daemon thread that uploads the unsent journal events with api.push_log every `interval_s`
+    seconds (or right after wake()). Failed uploads stay in the journal and are retried on the
+    next round, also after a restart of the kiosk.
+    """
+    def __init__(self, journal, api, interval_s=5.0, batch_rows=500):
+        '''
+        Args:
+            journal (AttendanceJournal): Journal cần upload.
+            api (APIClient): Client có push_log(df, timeout=..., idempotency_key=..., retries=...).
+            interval_s (float): Chu kỳ upload.
+            batch_rows (int): Số sự kiện tối đa mỗi lần gọi /save_log.
+        '''
+        self.journal = journal
+        self.api = api
+        self.interval_s = interval_s
+        self.batch_rows = batch_rows
+        self.uploaded = 0
+        self.last_error = None
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def flush(self, timeout=None):
+        """Uploads batches until the journal is empty; returns False if an upload failed."""
+        with self._flush_lock:
+            return self._flush(timeout)
+
+    def _flush(self, timeout=None, retries=None, deadline=None):
+        while deadline is None or time.monotonic() < deadline:
+            key, df = self.journal.next_batch(self.batch_rows)
+            if key is None:
+                return True
+            try:
+                self.api.push_log(df, timeout=timeout, idempotency_key=key, retries=retries)
+            except Exception as e:
+                self.last_error = str(e)
+                return False
+            self.journal.mark_sent(key)
+            self.uploaded += len(df)
+            self.last_error = None
+        return False
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.interval_s)
+            self._wakeup.clear()
+            try:
+                ok = self.flush()
+            except Exception as e:
+                # Journal bị đóng khi thoát lúc đang upload: batch chưa xoá được gửi lại (cùng key) lần sau
+                if self._stop.is_set():
+                    return
+                # Lỗi khác (vd. "database is locked"): ghi lại và thử ở vòng sau, không để luồng chết
+                self.last_error = f"{type(e).__name__}: {e}"
+                ok = False
+            if not ok and not self._stop.is_set():
+                print(f"-- attendance upload failed, will retry: {self.last_error} --")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="journal-uploader", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self, timeout=3.0):
+        """
+        Stops the thread and tries one last upload without retries, all within `timeout` seconds, so
+        closing the kiosk never waits on the network. The last upload is skipped while an upload is
+        still in flight; the events are already in the journal and are sent on the next start.
+        Returns True if nothing is left to upload.
+        """
+        deadline = time.monotonic() + timeout
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None  # luồng daemon còn chạy (đang upload) sẽ tự kết thúc cùng tiến trình
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not self._flush_lock.acquire(blocking=False):
+            return False
+        try:
+            return self._flush(timeout=(min(1.0, remaining), remaining), retries=0, deadline=deadline)
+        finally:
+            self._flush_lock.release()
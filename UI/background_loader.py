@@ -0,0 +1,51 @@
+import threading
+import time
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+class BackgroundLoader(QObject):
+    """
+    Runs a slow start-up step (loading FaceNet, fetching students.json, ...) on a daemon thread
+    so the window can appear first. The result or the error comes back as a Qt signal, which is
+    delivered on the GUI thread; `elapsed_s` is the duration of the step.
+    """
+    loaded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, fn, name="loader"):
+        '''
+        Args:
+            fn (callable): Hàm không tham số cần chạy nền; giá trị trả về được gửi qua `loaded`.
+            name (str): Tên luồng (để debug).
+        '''
+        super().__init__()
+        self.fn = fn
+        self.name = name
+        self.result = None
+        self.error = None
+        self.elapsed_s = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def is_ready(self):
+        return self.elapsed_s is not None and self.error is None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            result = self.fn()
+        except Exception as e:
+            self.error = str(e)
+            self.elapsed_s = time.perf_counter() - start
+            self.failed.emit(self.error)
+            return
+        self.result = result
+        self.elapsed_s = time.perf_counter() - start
+        self.loaded.emit(result)
@@ -11,4 +11,89 @@ class FaceDetector:
             gray, scaleFactor=scaleFactor, minNeighbors=minNeighbors,
             minSize=minSize, flags=cv2.CASCADE_SCALE_IMAGE
         )
-        return faces
\ No newline at end of file
+        return faces
+
+    def largest_face(self, frame, **kwargs):
+        faces = self.detect_faces(frame, **kwargs)
+        if len(faces) == 0:
+            return None
+        return tuple(int(v) for v in max(faces, key=lambda f: f[2] * f[3]))
+
+
+def box_iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    ih = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = iw * ih
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+class FaceTracker:
+    """
+    Follows the largest face between full detections.
+    A full detection (on a frame downscaled to detect_width) runs every `redetect_every` frames
+    or when the face is lost; in between, the cascade only searches an ROI around the last box.
+    track_id changes whenever the face is lost or a full detection lands somewhere else.
+    """
+    def __init__(self, detector, redetect_every=10, detect_width=480, roi_margin=0.5, min_size=(80, 80)):
+        self.detector = detector
+        self.redetect_every = redetect_every
+        self.detect_width = detect_width
+        self.roi_margin = roi_margin
+        self.min_size = min_size
+        self.box = None
+        self.track_id = 0
+        self.frames_since_detect = 0
+        self.full_detections = 0
+        self.roi_detections = 0
+
+    def reset(self):
+        self.box = None
+        self.frames_since_detect = 0
+
+    def _set_box(self, box, same_track_iou=0.3):
+        if box is not None and (self.box is None or box_iou(self.box, box) < same_track_iou):
+            self.track_id += 1
+        self.box = box
+
+    def _detect_full(self, frame):
+        self.full_detections += 1
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.detect_width / width) if self.detect_width else 1.0
+        if scale < 1.0:
+            frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        min_size = tuple(max(20, int(v * scale)) for v in self.min_size)
+        face = self.detector.largest_face(frame, minSize=min_size)
+        if face is None:
+            return None
+        return tuple(int(round(v / scale)) for v in face)
+
+    def _detect_roi(self, frame):
+        self.roi_detections += 1
+        x, y, w, h = self.box
+        mx, my = int(w * self.roi_margin), int(h * self.roi_margin)
+        x1, y1 = max(0, x - mx), max(0, y - my)
+        x2, y2 = min(frame.shape[1], x + w + mx), min(frame.shape[0], y + h + my)
+        min_size = (max(20, int(w * 0.6)), max(20, int(h * 0.6)))
+        face = self.detector.largest_face(frame[y1:y2, x1:x2], minSize=min_size)
+        if face is None:
+            return None
+        fx, fy, fw, fh = face
+        return (fx + x1, fy + y1, fw, fh)
+
+    def update(self, frame):
+        """Returns the (x, y, w, h) box of the tracked face in `frame`, or None."""
+        if self.box is None or self.frames_since_detect >= self.redetect_every:
+            self._set_box(self._detect_full(frame))
+            self.frames_since_detect = 0
+        else:
+            box = self._detect_roi(frame)
+            self.frames_since_detect += 1
+            if box is None:
+                # Mất dấu -> phát hiện lại toàn khung hình ngay
+                box = self._detect_full(frame)
+                self.frames_since_detect = 0
+            self._set_box(box)
+        return self.box
@@ -0,0 +1,177 @@
+import collections
+import threading
+import time
+from typing import Any, NamedTuple, Optional
+
+import cv2
+
+from tick_stats import TickStats
+
+
+class Frame(NamedTuple):
+    seq: int
+    image: Any          # BGR, owned by the grabber: read-only for consumers
+    captured_at: float
+
+
+class Detection(NamedTuple):
+    seq: int            # seq of the frame the detection ran on
+    image: Any
+    face: Optional[tuple]
+    track_id: Optional[int]
+
+
+class FrameGrabber:
+    """
+    Reads the camera on its own thread and keeps only the newest `buffer_size` frames in a ring
+    buffer, so the driver queue never backs up and consumers always see a recent frame.
+    A frame pushed out of the buffer before any consumer took it is counted as dropped (stale).
+    """
+    def __init__(self, source=0, width=1280, height=720, buffer_size=2):
+        '''
+        Args:
+            source (int | str): Chỉ số camera hoặc đường dẫn video.
+            width, height (int): Độ phân giải yêu cầu.
+            buffer_size (int): Số khung hình mới nhất được giữ lại.
+        '''
+        self.source = source
+        self.width = width
+        self.height = height
+        self.cap = None
+        self._frames = collections.deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._seq = 0
+        self._consumed = 0  # seq lớn nhất đã được lấy ra
+        self.captured = 0
+        self.dropped = 0
+        self.read_stats = TickStats()  # thời gian mỗi lần cap.read() (ms)
+        self.fps = 0.0
+        self._last_at = None
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.source)
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        # Giữ hàng đợi của driver ngắn nhất có thể (không phải backend nào cũng hỗ trợ)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return self.cap.isOpened()
+
+    def start(self):
+        if self.cap is None and not self.open():
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="camera-capture", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.read_stats.start()
+            ret, image = self.cap.read()
+            self.read_stats.stop()
+            if not ret:
+                time.sleep(0.01)
+                continue
+            now = time.perf_counter()
+            if self._last_at is not None:
+                # FPS trung bình động theo khoảng cách giữa hai khung hình
+                fps = 1.0 / max(now - self._last_at, 1e-6)
+                self.fps = fps if self.captured == 1 else self.fps + 0.05 * (fps - self.fps)
+            self._last_at = now
+            with self._cond:
+                self._seq += 1
+                self.captured += 1
+                if len(self._frames) == self._frames.maxlen and self._frames[0].seq > self._consumed:
+                    self.dropped += 1
+                self._frames.append(Frame(self._seq, image, now))
+                self._cond.notify_all()
+
+    def latest(self, after_seq=0, timeout=None):
+        """Returns the newest frame with seq > after_seq, or None (waits up to `timeout` seconds if given)."""
+        with self._cond:
+            if timeout is not None and (not self._frames or self._frames[-1].seq <= after_seq):
+                self._cond.wait(timeout)
+            if not self._frames or self._frames[-1].seq <= after_seq:
+                return None
+            frame = self._frames[-1]
+            self._consumed = max(self._consumed, frame.seq)
+            return frame
+
+    def as_dict(self):
+        return {
+            "capture_fps": round(self.fps, 1),
+            "captured": self.captured,
+            "dropped": self.dropped,
+            "read_mean_ms": self.read_stats.as_dict()["mean_ms"],
+        }
+
+
+class DetectionWorker:
+    """
+    Runs face detection on its own thread at its own rate: it always takes the newest frame of
+    the grabber, calls `detect(image) -> (face, track_id)` and publishes the latest Detection.
+    Frames that arrive while a detection is running are skipped, not queued.
+    """
+    def __init__(self, grabber, detect):
+        '''
+        Args:
+            grabber (FrameGrabber): Nguồn khung hình.
+            detect (callable): detect(image) -> (face (x, y, w, h) hoặc None, track_id).
+        '''
+        self.grabber = grabber
+        self.detect = detect
+        self.stats = TickStats()  # thời gian mỗi lần phát hiện (ms)
+        self._latest = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="face-detection", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        self._latest = None
+
+    def _run(self):
+        seq = 0
+        while not self._stop.is_set():
+            frame = self.grabber.latest(seq, timeout=0.1)
+            if frame is None:
+                continue
+            seq = frame.seq
+            self.stats.start()
+            try:
+                face, track_id = self.detect(frame.image)
+            except Exception as e:
+                print("Detection error:", e)
+                face, track_id = None, None
+            self.stats.stop()
+            self._latest = Detection(frame.seq, frame.image, face, track_id)
+
+    def latest(self, after_seq=0):
+        """Returns the newest Detection with seq > after_seq, or None."""
+        detection = self._latest
+        if detection is None or detection.seq <= after_seq:
+            return None
+        return detection
@@ -0,0 +1,194 @@
+"""
+On-kiosk recognition: runs the server's recognizer in-process, right after FaceEmbedding.
+
+GET /recognizer returns the served recognizer (the compiled random forest or the embedding
+gallery) together with students.json as one .npz, versioned by an ETag. The bundle is cached as
+
+    <cache_dir>/<version>.npz     one file per version (only the newest `keep` are kept)
+    <cache_dir>/current           name of the version in use
+
+so the kiosk starts from the cache, and keeps recognising while the server is unreachable.
+A background thread asks for a newer version every `check_interval_s` (a 304 when unchanged)
+and swaps the predictor atomically. Predictions have the same format as /predict.
+"""
+import io
+import json
+import os
+import threading
+
+import numpy as np
+
+
+def l2_normalize(X):
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    return X / norms
+
+
+class ForestPredictor:
+    """predict_proba of the server's CompiledForest (same node arrays, same traversal)."""
+    def __init__(self, arrays):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.leaf_proba = arrays["leaf_proba"]
+        self.roots = arrays["roots"]
+        self.depth = int(arrays["depth"])
+        self.classes_ = arrays["classes"]
+
+    def predict(self, X):
+        rows = np.arange(X.shape[0])[np.newaxis, :]
+        nodes = np.repeat(self.roots[:, np.newaxis], X.shape[0], axis=1)
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        proba = self.leaf_proba[nodes].mean(axis=0)
+        best = proba.argmax(axis=1)
+        return [
+            {"student_id": int(pred), "confidence": round(float(conf), 2)}
+            for pred, conf in zip(self.classes_[best], proba[np.arange(len(best)), best])
+        ]
+
+
+class GalleryPredictor:
+    """Cosine nearest-neighbour over the server's EmbeddingGallery index; -1 below the threshold."""
+    def __init__(self, arrays):
+        self.matrix = arrays["matrix"]
+        self.starts = arrays["starts"]
+        self.labels = arrays["labels"]
+        self.threshold = float(arrays["threshold"])
+
+    def predict(self, X):
+        if len(self.labels) == 0:
+            raise ValueError("Gallery chưa có dữ liệu sinh viên nào")
+        S = np.maximum.reduceat(l2_normalize(X) @ self.matrix.T, self.starts, axis=1)
+        best = S.argmax(axis=1)
+        sims = S[np.arange(len(best)), best]
+        ids = np.where(sims >= self.threshold, self.labels[best], -1)
+        return [
+            {"student_id": int(sid), "confidence": round(float(sim), 2) if sid != -1 else 0.0}
+            for sid, sim in zip(ids, sims)
+        ]
+
+
+PREDICTORS = {"forest": ForestPredictor, "gallery": GalleryPredictor}
+
+
+class LocalRecognizer:
+    def __init__(self, api, cache_dir="recognizer_cache", check_interval_s=60.0, keep=2):
+        '''
+        Args:
+            api (APIClient): Client dùng để tải bundle (load_recognizer).
+            cache_dir (str): Thư mục cache các phiên bản bundle.
+            check_interval_s (float): Chu kỳ kiểm tra phiên bản mới.
+            keep (int): Số phiên bản giữ lại trong cache.
+        '''
+        self.api = api
+        self.cache_dir = cache_dir
+        self.check_interval_s = check_interval_s
+        self.keep = keep
+        # (version, predictor, students) được thay cả bộ một lần -> luồng nhận diện luôn thấy một phiên bản nhất quán
+        self._current = (None, None, {})
+        self.last_error = None
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def version(self):
+        return self._current[0]
+
+    @property
+    def students(self):
+        return self._current[2]
+
+    def ready(self):
+        return self._current[1] is not None
+
+    # --- Cache ---
+    def _path(self, version):
+        return os.path.join(self.cache_dir, f"{version}.npz")
+
+    def _activate(self, version, data):
+        with np.load(io.BytesIO(data), allow_pickle=False) as bundle:
+            arrays = {name: bundle[name] for name in bundle.files}
+        kind = str(arrays.pop("kind"))
+        students = json.loads(str(arrays.pop("students")))
+        self._current = (version, PREDICTORS[kind](arrays), students)
+
+    def load_cached(self):
+        """Loads the cached version in use, if any; returns True on success."""
+        try:
+            with open(os.path.join(self.cache_dir, "current"), encoding="utf-8") as f:
+                version = f.read().strip()
+            with open(self._path(version), "rb") as f:
+                self._activate(version, f.read())
+        except (OSError, ValueError, KeyError) as e:
+            self.last_error = str(e)
+            return False
+        return True
+
+    def _store(self, version, data):
+        for path, content in ((self._path(version), data), (os.path.join(self.cache_dir, "current"), version.encode("utf-8"))):
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(content)
+            os.replace(tmp, path)
+        bundles = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(".npz")]
+        for path in sorted(bundles, key=os.path.getmtime, reverse=True)[self.keep:]:
+            os.remove(path)
+
+    def sync(self):
+        """Downloads the bundle if the server has a newer version; returns True if a new version was activated."""
+        version, data = self.api.load_recognizer(self.version)
+        if data is None:
+            return False
+        self._activate(version, data)
+        self._store(version, data)
+        print(f"-- Local recognizer {version} loaded. --")
+        return True
+
+    # --- Prediction ---
+    def predict_embeddings(self, embeddings):
+        predictor = self._current[1]
+        if predictor is None:
+            raise ValueError("Chưa có recognizer local (chưa tải được từ server)")
+        return predictor.predict(np.asarray(embeddings, dtype=np.float32).reshape(-1, 512))
+
+    def predict_embedding(self, vec_embedding):
+        return self.predict_embeddings(vec_embedding)[0]
+
+    # --- Background sync ---
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sync()
+                self.last_error = None
+            except Exception as e:
+                # Server tạm thời không truy cập được -> tiếp tục dùng phiên bản đang có
+                self.last_error = str(e)
+                print(f"-- Local recognizer sync failed: {e} --")
+            self._wakeup.wait(self.check_interval_s)
+            self._wakeup.clear()
+
+    def start(self):
+        """Loads the cached version, then checks for new versions in a daemon thread."""
+        if not self.ready():
+            self.load_cached()
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="local-recognizer", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
@@ -0,0 +1,83 @@
+import cv2
+import numpy as np
+from PyQt5.QtGui import QImage, QPixmap
+
+# Qt >= 5.14 hiển thị trực tiếp BGR -> không cần đổi kênh màu
+BGR888 = getattr(QImage, "Format_BGR888", None)
+
+
+class PreviewRenderer:
+    """
+    Draws the camera preview into buffers preallocated for the current label size.
+
+    The centre square of the frame is resized straight into a reused BGR buffer (a view of the
+    frame, no full-frame copy), overlays are drawn on that small image, and the buffer is
+    wrapped by a QImage without conversion when Qt supports BGR888 (otherwise one cvtColor into
+    a reused RGB buffer). Buffers are only reallocated when the label size changes, and
+    render() returns None when neither the frame, the overlay nor the size changed.
+    """
+    def __init__(self, box_color=(255, 123, 0), box_thickness=3):
+        '''
+        Args:
+            box_color (tuple): Màu khung khuôn mặt (BGR).
+            box_thickness (int): Độ dày khung theo pixel của khung hình gốc.
+        '''
+        self.box_color = box_color
+        self.box_thickness = box_thickness
+        self.size = 0
+        self._bgr = None
+        self._rgb = None
+        self._image = None
+        self._key = None
+        self.rendered = 0
+        self.skipped = 0
+
+    def _allocate(self, size):
+        self.size = size
+        self._bgr = np.empty((size, size, 3), dtype=np.uint8)
+        if BGR888 is not None:
+            self._image = QImage(self._bgr.data, size, size, self._bgr.strides[0], BGR888)
+        else:
+            self._rgb = np.empty((size, size, 3), dtype=np.uint8)
+            self._image = QImage(self._rgb.data, size, size, self._rgb.strides[0], QImage.Format_RGB888)
+
+    def render(self, seq, frame, face, size):
+        """
+        Args:
+            seq (int): Số thứ tự khung hình (để bỏ qua khung hình đã vẽ).
+            frame (np.ndarray): Khung hình BGR gốc (không bị sửa).
+            face (tuple): Khuôn mặt (x, y, w, h) trên khung hình gốc, hoặc None.
+            size (int): Cạnh của vùng hiển thị vuông.
+        Returns:
+            QPixmap: Ảnh preview, hoặc None nếu không có gì thay đổi.
+        """
+        key = (seq, face, size)
+        if size <= 0 or key == self._key:
+            self.skipped += 1
+            return None
+        if size != self.size:
+            self._allocate(size)
+
+        # Crop to square from center
+        height, width = frame.shape[:2]
+        crop_size = min(height, width)
+        x1 = (width - crop_size) // 2
+        y1 = (height - crop_size) // 2
+        square = frame[y1:y1 + crop_size, x1:x1 + crop_size]
+        interpolation = cv2.INTER_AREA if size < crop_size else cv2.INTER_LINEAR
+        cv2.resize(square, (size, size), dst=self._bgr, interpolation=interpolation)
+
+        # Vẽ khung sau khi resize: trên ảnh nhỏ và không đụng tới khung hình gốc
+        if face is not None:
+            scale = size / crop_size
+            x, y, w, h = face
+            p1 = (int((x - x1) * scale), int((y - y1) * scale))
+            p2 = (int((x + w - x1) * scale), int((y + h - y1) * scale))
+            cv2.rectangle(self._bgr, p1, p2, self.box_color, max(1, round(self.box_thickness * scale)))
+
+        if self._rgb is not None:
+            cv2.cvtColor(self._bgr, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        self._key = key
+        self.rendered += 1
+        # fromImage sao chép dữ liệu nên buffer có thể dùng lại ngay ở khung hình sau
+        return QPixmap.fromImage(self._image)
@@ -0,0 +1,133 @@
+import concurrent.futures
+import multiprocessing
+import os
+import queue
+import threading
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from src.video_pipeline import EmbeddingBuffer, FrameSampler
+
+# --- Worker process side ---
+_processor = None
+
+
+def _init_worker():
+    # Mỗi tiến trình tải FaceNet một lần và dùng lại cho mọi video của nó
+    global _processor
+    from src.preprocessing import Processing_Img
+    # ENROL_TARGET_FRAMES=N: chỉ giữ tối đa N khuôn mặt rõ nét, khác nhau cho mỗi sinh viên (mặc định tắt)
+    target_frames = int(os.environ.get("ENROL_TARGET_FRAMES", 0))
+    _processor = Processing_Img({}, sampler=FrameSampler(target_frames=target_frames) if target_frames else None)
+
+
+def _process_video(video_path, student_id, student_name, events, cancel):
+    def progress(done, total):
+        events.put((video_path, done, total))
+    return _processor.frame_to_vector(video_path, student_id, student_name, cancel=cancel, progress=progress)
+
+
+class RegistrationJob(QObject):
+    """
+    Registers new students from enrolment videos without blocking the GUI thread.
+    Videos are processed in a pool of worker processes (one FaceNet per process); a monitor
+    thread relays per-frame progress as Qt signals, and the embeddings + students are uploaded
+    with push_data / push_json_data only after every video finished. cancel() stops the
+    workers and nothing is uploaded.
+    """
+    progress = pyqtSignal(str, int, int)    # video_path, frames done, frames total (0 = unknown)
+    video_done = pyqtSignal(str, int)       # video_path, rows
+    video_failed = pyqtSignal(str, str)     # video_path, error
+    finished = pyqtSignal(dict, int)        # new students {id: name}, rows uploaded
+    failed = pyqtSignal(str)                # upload error
+    cancelled = pyqtSignal()
+
+    def __init__(self, api, videos, students, max_workers=None):
+        '''
+        Args:
+            api (APIClient): Client dùng để upload kết quả.
+            videos (list): Danh sách (video_path, student_id, student_name).
+            students (dict): Danh sách sinh viên hiện có {id: name}, được gửi kèm sinh viên mới.
+            max_workers (int): Số tiến trình xử lý video (mặc định tối đa 2, mỗi tiến trình một FaceNet).
+        '''
+        super().__init__()
+        self.api = api
+        self.videos = list(videos)
+        self.students = dict(students)
+        self.max_workers = max_workers or max(1, min(len(self.videos), 2, os.cpu_count() or 1))
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="registration-job", daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _drain(self, events):
+        while True:
+            try:
+                video_path, done, total = events.get_nowait()
+            except queue.Empty:
+                return
+            self.progress.emit(video_path, done, total)
+
+    def _run(self):
+        result = EmbeddingBuffer()
+        new_students = {}
+        # spawn: không fork tiến trình GUI (Qt / TensorFlow không an toàn khi fork)
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Manager() as manager:
+            events = manager.Queue()
+            cancel = manager.Event()
+            with concurrent.futures.ProcessPoolExecutor(self.max_workers, mp_context=ctx,
+                                                        initializer=_init_worker) as pool:
+                futures = {
+                    pool.submit(_process_video, path, student_id, name, events, cancel): (path, student_id, name)
+                    for path, student_id, name in self.videos
+                }
+                pending = set(futures)
+                while pending:
+                    if self._cancel.is_set():
+                        cancel.set()
+                        for future in pending:
+                            future.cancel()
+                    done, pending = concurrent.futures.wait(pending, timeout=0.1)
+                    self._drain(events)
+                    for future in done:
+                        path, student_id, name = futures[future]
+                        if future.cancelled():
+                            continue
+                        try:
+                            buffer = future.result()
+                        except Exception as e:
+                            self.video_failed.emit(path, str(e))
+                            continue
+                        if buffer is None:
+                            if not self._cancel.is_set():
+                                self.video_failed.emit(path, "Không thể đọc video")
+                            continue
+                        result.extend(buffer.embeddings, buffer.labels)
+                        new_students[student_id] = name
+                        self.video_done.emit(path, len(buffer))
+                self._drain(events)
+
+        if self._cancel.is_set():
+            self.cancelled.emit()
+            return
+        if not len(result):
+            self.finished.emit({}, 0)
+            return
+        try:
+            # Chỉ upload khi toàn bộ job đã xong
+            self.api.push_data(result.to_frame())
+            self.students.update(new_students)
+            self.api.push_json_data(self.students)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.finished.emit(new_students, len(result))
@@ -1,34 +1,59 @@
-from keras_facenet import FaceNet
 import cv2
 import numpy as np
-import os
+from . import inference_backend
 
 class FaceEmbedding:
     """
     Class to handle face detection, cropping, and embedding extraction.
     This class uses Haar Cascade classifier for face detection and FaceNet for embedding extraction.
     """
-    def __init__(self, model_path=None):
+    def __init__(self, model_path=None, batch_size=32, backend=None):
         '''
         Khởi tạo model dectect face và embedding face.
         Args:
             model_path (str): Đường dẫn đến mô hình FaceNet đã được huấn luyện trước.
             Nếu không có, sẽ sử dụng mô hình mặc định.
+            batch_size (int): Số khuôn mặt tối đa trong một lần gọi FaceNet (embed_batch).
+            backend (str): "keras", "tflite", "tflite-fp16" hoặc "tflite-int8" (mặc định FACENET_BACKEND
+            hoặc "keras"); bản TFLite được chuyển đổi một lần rồi lưu cache trên đĩa.
         '''
         self.model_path = model_path
-        self.embedder = FaceNet(model_path) if model_path else FaceNet()
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self.batch_size = batch_size
+        self.backend = inference_backend.resolve_backend(backend)
+        if self.backend == "keras":
+            self.embedder = self.keras_facenet()
+        else:
+            # Có file .tflite trong cache thì không dựng model Keras; chỉ dựng khi cần chuyển đổi lần đầu
+            self.embedder = inference_backend.load_tflite(lambda: self.keras_facenet().model, self.backend,
+                                                          model_path or "default")
+        self.face_cascade = self.new_cascade()
 
-    def detect_face(self, img):
+    def keras_facenet(self):
+        # Import TensorFlow / keras_facenet chỉ khi thực sự tạo model (import module này vẫn nhẹ)
+        from keras_facenet import FaceNet
+        return FaceNet(self.model_path) if self.model_path else FaceNet()
+
+    def warm_up(self, batch_size=1):
+        """Chạy FaceNet một lần trên một ảnh giả để khởi tạo graph / cấp phát tensor trước lần nhận diện đầu tiên."""
+        crop = np.random.default_rng(0).integers(0, 256, (160, 160, 3), dtype=np.uint8)
+        self.embed_batch([crop] * batch_size, batch_size)
+
+    def new_cascade(self):
+        """Tạo một Haar cascade mới (mỗi luồng phát hiện song song dùng một bộ riêng)."""
+        return cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+    def detect_face(self, img, cascade=None):
         """Detects faces in an image using Haar Cascade classifier.
         This function takes an image as input and returns the coordinates of detected faces.
         Args:
             img (_type_): Ảnh chứa khuôn mặt cần phát hiện.
+            cascade (cv2.CascadeClassifier): Bộ phát hiện dùng thay cho self.face_cascade (khi chạy đa luồng).
         Returns:
             List: Chứa các tọa độ của khuôn mặt được phát hiện trong định dạng (x, y, w, h).
         """
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5)
+        cascade = cascade if cascade is not None else self.face_cascade
+        faces = cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5)
         return faces  # List of (x, y, w, h)
 
     def crop_and_preprocess_face(self, img, face):
@@ -44,10 +69,59 @@ class FaceEmbedding:
         face_img = cv2.resize(face_img, (160, 160))  # chuẩn cho model như FaceNet
         return face_img
 
+    def largest_face(self, img, cascade=None):
+        """Trả về khuôn mặt (x, y, w, h) có diện tích lớn nhất, hoặc None nếu không phát hiện được."""
+        faces = self.detect_face(img, cascade)
+        if len(faces) == 0:
+            return None
+        return max(faces, key=lambda rect: rect[2] * rect[3])
+
+    def face_crop(self, img, face):
+        """Cắt, resize về 160x160 và chuyển sang RGB, sẵn sàng cho FaceNet."""
+        face_img = self.crop_and_preprocess_face(img, face)
+        return cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)
+
     def extract_embedding(self, face_img):
         # face_img: 160x160x3, RGB
         return self.embedder.embeddings([face_img])[0]  # return vector 512-D
-    
+
+    def embed_batch(self, crops, batch_size=None):
+        """
+        Trích xuất embedding cho nhiều khuôn mặt, gọi FaceNet theo từng batch.
+        Args:
+            crops (list): Các ảnh khuôn mặt 160x160x3, RGB (kết quả của face_crop).
+            batch_size (int): Số khuôn mặt mỗi lần gọi FaceNet, mặc định là self.batch_size.
+        Returns:
+            np.ndarray: Ma trận (N, 512) float32 liên tục, dòng i ứng với crops[i].
+        """
+        batch_size = batch_size or self.batch_size
+        embeddings = np.empty((len(crops), 512), dtype=np.float32)
+        for start in range(0, len(crops), batch_size):
+            batch = np.asarray(crops[start:start + batch_size])
+            embeddings[start:start + len(batch)] = self.embedder.embeddings(batch)
+        return embeddings
+
+    def embedding_faces(self, frames, batch_size=None):
+        """
+        Phát hiện, cắt khuôn mặt lớn nhất của nhiều khung hình rồi embedding chúng theo batch.
+        Args:
+            frames (list): Các khung hình BGR.
+            batch_size (int): Số khuôn mặt mỗi lần gọi FaceNet.
+        Returns:
+            tuple: (embeddings, mask)
+                embeddings (np.ndarray): (N, 512) float32, N = số khung hình có khuôn mặt, theo thứ tự.
+                mask (np.ndarray): (len(frames),) bool, True nếu khung hình có khuôn mặt.
+        """
+        mask = np.zeros(len(frames), dtype=bool)
+        crops = []
+        for i, frame in enumerate(frames):
+            face = self.largest_face(frame)
+            if face is None:
+                continue
+            crops.append(self.face_crop(frame, face))
+            mask[i] = True
+        return self.embed_batch(crops, batch_size), mask
+
     def embedding_face(self, img):
         """
         Trích xuất embedding cho 1 ảnh đầu vào.
@@ -56,13 +130,10 @@ class FaceEmbedding:
         Returns:
             _type_: embedding vector 512-D
         """
-        faces = self.detect_face(img)
-        if len(faces) == 0:
-            return None
         # Lấy khuôn mặt có diện tích lớn nhất
-        face = max(faces, key=lambda rect: rect[2] * rect[3])
-        face_img = self.crop_and_preprocess_face(img, face)
-        face_img = cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)
+        face = self.largest_face(img)
+        if face is None:
+            return None
         # face_img = face_img.astype('float32')
-        embedding = self.extract_embedding(face_img)
+        embedding = self.extract_embedding(self.face_crop(img, face))
         return embedding
\ No newline at end of file
@@ -0,0 +1,121 @@
+"""
+Interchangeable inference backends for the FaceNet graph used by FaceEmbedding.
+
+    keras         the reference keras_facenet model (default)
+    tflite        TFLite conversion, float32 weights
+    tflite-fp16   TFLite conversion, float16 weights
+    tflite-int8   TFLite conversion, int8 weights (dynamic-range quantisation)
+
+A TFLite variant is converted from the Keras model the first time it is used and cached as
+
+    <cache_dir>/facenet-<model>-<variant>.tflite
+
+so later runs only load the flat buffer: the Keras model is not built at all on a cache hit, and the
+input standardisation FaceNet.embeddings applies is done by standardize(). The backend is selected with FaceEmbedding(backend=...)
+or the FACENET_BACKEND environment variable; FACENET_CACHE_DIR and FACENET_THREADS override the
+cache directory and the number of interpreter threads.
+"""
+import os
+import threading
+
+import numpy as np
+
+BACKENDS = ("keras", "tflite", "tflite-fp16", "tflite-int8")
+DEFAULT_CACHE_DIR = os.path.join("~", ".keras-facenet", "tflite")
+
+
+def resolve_backend(backend=None):
+    backend = (backend or os.environ.get("FACENET_BACKEND", "keras")).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown FaceNet backend: {backend} (expected one of {', '.join(BACKENDS)})")
+    return backend
+
+
+def cache_path(backend, model_name="default", cache_dir=None):
+    cache_dir = os.path.expanduser(cache_dir or os.environ.get("FACENET_CACHE_DIR", DEFAULT_CACHE_DIR))
+    variant = backend.split("-", 1)[1] if "-" in backend else "fp32"
+    model_name = os.path.basename(str(model_name)).replace(os.sep, "_") or "default"
+    return os.path.join(cache_dir, f"facenet-{model_name}-{variant}.tflite")
+
+
+def standardize(images):
+    """FaceNet's per-image standardisation ((x - mean) / std), vectorised over an (N, 160, 160, 3) batch."""
+    X = np.asarray(images, dtype=np.float32)
+    axes = tuple(range(1, X.ndim))
+    mean = X.mean(axis=axes, keepdims=True)
+    std = X.std(axis=axes, keepdims=True)
+    # Ảnh đồng màu (std = 0) không chia cho 0
+    std = np.maximum(std, 1.0 / np.sqrt(X[0].size if len(X) else 1))
+    return (X - mean) / std
+
+
+def convert(keras_model, backend, path):
+    """Converts the Keras model to the TFLite variant `backend` and writes it atomically to `path`."""
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    if backend == "tflite-fp16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif backend == "tflite-int8":
+        # Trọng số int8, activation vẫn float -> không cần tập dữ liệu hiệu chỉnh
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    flatbuffer = converter.convert()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(flatbuffer)
+    os.replace(tmp, path)
+    return path
+
+
+class TFLiteModel:
+    """
+    TFLite counterpart of the FaceNet Keras model: predict(x) on a standardised float32
+    (N, 160, 160, 3) batch, embeddings(images) on raw 160x160 RGB crops like FaceNet.embeddings.
+    The interpreter is not thread-safe, so calls are serialised with a lock.
+    """
+    def __init__(self, path, num_threads=None):
+        '''
+        Args:
+            path (str): Đường dẫn file .tflite.
+            num_threads (int): Số luồng của interpreter (mặc định FACENET_THREADS hoặc số CPU).
+        '''
+        import tensorflow as tf
+
+        self.path = path
+        num_threads = num_threads or int(os.environ.get("FACENET_THREADS", 0)) or os.cpu_count() or 1
+        self.interpreter = tf.lite.Interpreter(model_path=path, num_threads=num_threads)
+        self._input = self.interpreter.get_input_details()[0]["index"]
+        self._output = self.interpreter.get_output_details()[0]["index"]
+        self._batch = None
+        self._lock = threading.Lock()
+
+    def predict(self, x, **kwargs):
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        with self._lock:
+            if self._batch != len(x):
+                # Chỉ cấp phát lại tensor khi kích thước batch thay đổi
+                self.interpreter.resize_tensor_input(self._input, list(x.shape))
+                self.interpreter.allocate_tensors()
+                self._batch = len(x)
+            self.interpreter.set_tensor(self._input, x)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output).copy()
+
+    __call__ = predict
+
+    def embeddings(self, images):
+        return self.predict(standardize(images))
+
+
+def load_tflite(keras_model, backend, model_name="default", cache_dir=None, num_threads=None):
+    """
+    Returns a TFLiteModel for `backend`. `keras_model` is a callable returning the Keras model; it is
+    only called when the .tflite file is not cached yet and has to be converted.
+    """
+    path = cache_path(backend, model_name, cache_dir)
+    if not os.path.exists(path):
+        print(f"-- Converting FaceNet to {backend}: {path} --")
+        convert(keras_model(), backend, path)
+    return TFLiteModel(path, num_threads)
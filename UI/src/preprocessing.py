@@ -1,13 +1,18 @@
 import cv2
-import os
-import glob
-import pandas as pd
 from src import feature_engineering as fe
+from src.video_pipeline import EmbeddingBuffer, VideoEmbeddingPipeline
 
 class Processing_Img():
-    def __init__(self, student):
+    def __init__(self, student, sampler=None):
+        '''
+        Args:
+            student (dict): Các sinh viên đã có {student_id: student_name}.
+            sampler (FrameSampler): Lấy mẫu khung hình thông minh (tuỳ chọn); None = 1 trên `interval` khung hình.
+        '''
         self.student = student
         self.embedder = fe.FaceEmbedding()
+        # decode -> phát hiện/cắt khuôn mặt song song -> embedding theo batch
+        self.pipeline = VideoEmbeddingPipeline(self.embedder, transform=self.rotate_to_portrait, sampler=sampler)
     
     # Hàm xoay khung hình để đảm bảo định dạng dọc
     def rotate_to_portrait(self, frame):
@@ -26,58 +31,37 @@ class Processing_Img():
             frame = cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
         return frame
 
-    def frame_to_vector(self, video_path, student_id, student_name, interval=5):
+    def frame_to_vector(self, video_path, student_id, student_name, interval=5, cancel=None, progress=None):
         """
         Đọc tất cả các tệp video trong thư mục video_dir và trích xuất khung hình và xử lý nó từ mỗi video.
         Embedding các frame đã xử lý đó thành các vector d-512
         Args:
-        Returns: DataFrame chứa các vector d-512, student_id và student_name cho mỗi khung hình đã xử lý.
+            interval (int): Chỉ xử lý 1 trên `interval` khung hình.
+            cancel (threading.Event): Đặt để dừng xử lý giữa chừng (khi đó trả về None).
+            progress (callable): progress(done, total) theo số khung hình đã xử lý.
+        Returns: EmbeddingBuffer chứa các vector d-512 (float32) và student_id cho mỗi khung hình đã xử lý.
         """
+        if not str(student_id).isdecimal():
+            print(f"Mã sinh viên phải là số, bỏ qua: {student_id}")
+            return
         if student_id in self.student:
             print(f"Đã tồn tại student_id {student_id} trong danh sách sinh viên.")
             return
         
-        df = pd.DataFrame(columns=range(513))  # 512 cho embedding + 1 cho student_id
-        index = 0
-        
-        cap = cv2.VideoCapture(video_path)
+        buffer = EmbeddingBuffer()  # 512 cho embedding + 1 cho student_id
         
-        # Kiểm tra xem video có được mở thành công không
-        if not cap.isOpened():
-            print(f"Lỗi: Không thể mở video {video_path}")
+        try:
+            embeddings = self.pipeline.run(video_path, interval=interval, cancel=cancel, progress=progress)
+        except IOError as e:
+            print(f"Lỗi: {e}")
             return
-        
-        # In thông tin FPS của video gốc
-        actual_fps = cap.get(cv2.CAP_PROP_FPS)
-        
-        # Khởi tạo biến đếm cho khung hình
-        frame_count = 0
-        
-        # Duyệt qua các khung hình
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                print(f"Hết video hoặc lỗi khi đọc khung hình tại {video_path}")
-                break
-            
-            if frame_count % interval == 0:
-                # Trích xuất khung hình tại khoảng thời gian nhất định
-                # Xoay khung hình để đảm bảo định dạng dọc
-                frame = self.rotate_to_portrait(frame)
-                embedding = self.embedder.embedding_face(frame)  # Trích xuất embedding cho khuôn mặt
-                if embedding is None:
-                    frame_count += 1
-                    continue
-                embedding = pd.Series(embedding)
-                embedding = pd.concat([embedding, pd.Series([student_id])], ignore_index=True)
-                df.loc[index] = embedding
-                index += 1
-            frame_count += 1
-        
-        # Giải phóng đối tượng VideoCapture
-        cap.release()
+        if embeddings is None:
+            print(f"Đã huỷ xử lý video {video_path}")
+            return
+
+        buffer.extend(embeddings, int(student_id))
         # In thông báo kết quả cho video hiện tại
         print(f"Đã trích xuất khung hình từ video của sinh viên {student_id} - {student_name}")
         self.student[student_id] = student_name  # Thêm student_id và student_name vào dictionary
         print("Hoàn tất xử lý tất cả video.")
-        return df
\ No newline at end of file
+        return buffer
\ No newline at end of file
@@ -0,0 +1,70 @@
+"""
+Measures kiosk start-up: imports, window construction, first paint, students.json, FaceNet
+load + warm-up and (with --camera) the first camera frame, all relative to process start.
+
+Usage (from the UI directory):
+    python startup_time.py
+    python startup_time.py --camera --timeout 60
+    FACENET_BACKEND=tflite-fp16 python startup_time.py
+"""
+import time
+
+T0 = time.perf_counter()
+
+import argparse
+import sys
+
+marks = []
+
+
+def mark(name):
+    marks.append((name, time.perf_counter() - T0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--camera", action="store_true", help="Also start the camera and wait for the first frame")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait for the background loaders")
+    args = parser.parse_args()
+
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication(sys.argv)
+    mark("QApplication")
+    from ui import FaceAttendanceUI
+    mark("import ui")
+
+    window = FaceAttendanceUI()
+    mark("window constructed")
+    window.show()
+    app.processEvents()
+    mark("window shown")
+
+    # Chờ các bước chạy nền (start_background_loading được gọi khi vòng lặp sự kiện chạy)
+    pending = {"students.json": lambda: window.students_loader, "FaceNet ready": lambda: window.model_loader}
+    if args.camera:
+        window.start_camera()
+        pending["first frame"] = lambda: window if window.tick_stats.count else None
+    deadline = time.perf_counter() + args.timeout
+    while pending and time.perf_counter() < deadline:
+        app.processEvents()
+        for name, probe in list(pending.items()):
+            target = probe()
+            if target is window or (target is not None and target.elapsed_s is not None):
+                error = getattr(target, "error", None)
+                mark(f"{name} (failed: {error})" if error else name)
+                del pending[name]
+        time.sleep(0.005)
+    for name in pending:
+        print(f"-- {name}: not reached after {args.timeout:.0f} s --")
+
+    print(f"{'step':<40} {'t (s)':>8}")
+    for name, t in marks:
+        print(f"{name:<40} {t:>8.3f}")
+    if args.camera:
+        print("Camera loop:", window.frame_stats())
+        window.stop_camera()
+    sys.exit(1 if pending else 0)
+
+
+if __name__ == "__main__":
+    main()
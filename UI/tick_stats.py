@@ -0,0 +1,35 @@
+import time
+
+
+class TickStats:
+    """Per-tick cost of the camera loop: last, moving average (EMA) and max, in milliseconds."""
+    def __init__(self, alpha=0.05):
+        self.alpha = alpha
+        self.count = 0
+        self.last_ms = 0.0
+        self.mean_ms = 0.0
+        self.max_ms = 0.0
+        self._start = None
+
+    def start(self):
+        self._start = time.perf_counter()
+
+    def stop(self):
+        if self._start is None:
+            return
+        self.add((time.perf_counter() - self._start) * 1000.0)
+        self._start = None
+
+    def add(self, ms):
+        self.count += 1
+        self.last_ms = ms
+        self.mean_ms = ms if self.count == 1 else self.mean_ms + self.alpha * (ms - self.mean_ms)
+        self.max_ms = max(self.max_ms, ms)
+
+    def as_dict(self):
+        return {
+            "ticks": self.count,
+            "last_ms": round(self.last_ms, 3),
+            "mean_ms": round(self.mean_ms, 3),
+            "max_ms": round(self.max_ms, 3),
+        }
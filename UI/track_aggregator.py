@@ -0,0 +1,111 @@
+import cv2
+import numpy as np
+
+
+class TrackAggregator:
+    """
+    Recognises one tracked face from several frames instead of a single snapshot.
+
+    Quality-gated crops of the current track are collected (at most one every sample_interval_s).
+    Once min_frames are available they are embedded in one FaceNet batch and either
+    - "average": averaged into a single query for /predict, or
+    - "vote":    sent together to /predict_batch and reduced by confidence-weighted voting.
+    The predictor is the APIClient or, in local mode, a LocalRecognizer (same interface).
+    Querying stops for the track as soon as the consensus confidence reaches the threshold.
+    A track still below it after max_frames crops, or whose query failed, is queried again with
+    fresh (resp. the same) crops after retry_interval_s; a new track starts over.
+    """
+    def __init__(self, mode="average", threshold=0.5, min_frames=3, max_frames=8,
+                 sample_interval_s=0.15, min_sharpness=30.0, retry_interval_s=5.0):
+        '''
+        Args:
+            mode (str): "average" hoặc "vote".
+            threshold (float): Độ tin cậy đồng thuận để dừng nhận diện track hiện tại.
+            min_frames (int): Số khuôn mặt tối thiểu trước lần gọi API đầu tiên.
+            max_frames (int): Số khuôn mặt tối đa cho một track.
+            sample_interval_s (float): Khoảng cách tối thiểu giữa hai khuôn mặt được lấy.
+            min_sharpness (float): Ngưỡng độ nét (phương sai Laplacian) của khuôn mặt.
+            retry_interval_s (float): Thời gian chờ trước khi nhận diện lại track chưa đủ tin cậy hoặc bị lỗi.
+        '''
+        if mode not in ("average", "vote"):
+            raise ValueError(f"Unknown aggregation mode: {mode}")
+        self.mode = mode
+        self.threshold = threshold
+        self.min_frames = min_frames
+        self.max_frames = max_frames
+        self.sample_interval_s = sample_interval_s
+        self.min_sharpness = min_sharpness
+        self.retry_interval_s = retry_interval_s
+        self.track_id = None
+        self.reset(None)
+
+    def reset(self, track_id):
+        self.track_id = track_id
+        self.crops = []
+        self.queried = 0       # số crop đã dùng ở lần gọi API gần nhất
+        self.result = None     # kết quả mới nhất của track
+        self.decided = False   # chỉ True khi kết quả đủ tin cậy
+        self._last_sample = float("-inf")
+        self._retry_at = float("-inf")
+
+    def wants_sample(self, now):
+        return (not self.decided and now >= self._retry_at and len(self.crops) < self.max_frames
+                and now - self._last_sample >= self.sample_interval_s)
+
+    def add(self, crop, now):
+        """Adds a 160x160 RGB crop if it is sharp enough; returns True if it was kept."""
+        gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+        if cv2.Laplacian(gray, cv2.CV_64F).var() < self.min_sharpness:
+            return False
+        self.crops.append(crop)
+        self._last_sample = now
+        return True
+
+    def ready(self, now):
+        """True when there are enough new crops for a (re)query of the track."""
+        return (not self.decided and now >= self._retry_at
+                and len(self.crops) >= self.min_frames and len(self.crops) > self.queried)
+
+    def take_query(self):
+        """Returns (track_id, crops) for the next query and marks them as queried."""
+        self.queried = len(self.crops)
+        return self.track_id, list(self.crops)
+
+    def recognise(self, embedder, predictor, crops):
+        """Runs in the worker thread: one FaceNet batch, then one prediction call. Returns {student_id, confidence}."""
+        embeddings = embedder.embed_batch(crops)
+        if self.mode == "average":
+            # Trung bình rồi đưa về độ dài trung bình của các embedding gốc
+            mean = embeddings.mean(axis=0)
+            norm = np.linalg.norm(mean)
+            if norm > 0:
+                mean *= np.linalg.norm(embeddings, axis=1).mean() / norm
+            return predictor.predict_embedding(mean)
+        predictions = predictor.predict_embeddings(embeddings)
+        return self.vote(predictions)
+
+    @staticmethod
+    def vote(predictions):
+        scores = {}
+        for p in predictions:
+            scores[p["student_id"]] = scores.get(p["student_id"], 0.0) + float(p["confidence"])
+        student_id = max(scores, key=scores.get)
+        return {"student_id": student_id, "confidence": scores[student_id] / len(predictions), "votes": len(predictions)}
+
+    def update(self, track_id, result, now):
+        """Records the result of a query (None if it failed); stale results of a previous track are ignored."""
+        if track_id != self.track_id:
+            return False
+        self.result = result
+        if result is None:
+            # Gọi lỗi: thử lại đúng các crop này sau retry_interval_s
+            self.queried = 0
+            self._retry_at = now + self.retry_interval_s
+        elif result["confidence"] >= self.threshold:
+            self.decided = True
+        elif len(self.crops) >= self.max_frames:
+            # Chưa chắc chắn dù đã đủ max_frames (vd. góc mặt xấu): bỏ các crop cũ, gom lại sau retry_interval_s
+            self.crops = []
+            self.queried = 0
+            self._retry_at = now + self.retry_interval_s
+        return True
@@ -1,59 +1,85 @@
 import os
 import cv2
-import pandas as pd
 import time
-import json
 import concurrent.futures
 
 from PyQt5.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QPushButton, QLabel,
+    QWidget, QVBoxLayout, QPushButton, QLabel,
     QHBoxLayout, QProgressBar, QMessageBox, QSizePolicy,
-    QSplitter, QListWidget, QListWidgetItem, QInputDialog, QFileDialog
+    QSplitter, QListWidget, QListWidgetItem, QInputDialog, QFileDialog, QProgressDialog
 )
-from PyQt5.QtGui import QImage, QPixmap, QFont, QPalette, QColor, QIcon, QMovie
+from PyQt5.QtGui import QFont, QPalette, QColor, QIcon, QMovie
 from PyQt5.QtCore import Qt, QTimer, QSize
 
 from api_client import APIClient
+from attendance_journal import AttendanceJournal, JournalUploader
+from local_recognizer import LocalRecognizer
 # from dialogs import StudentRegistrationDialog
-from face_detector import FaceDetector
+from face_detector import FaceDetector, FaceTracker
+from frame_grabber import DetectionWorker, FrameGrabber
+from preview_renderer import PreviewRenderer
 from attendance_manager import AttendanceManager
 
 from src.feature_engineering import FaceEmbedding
-from src.preprocessing import Processing_Img
+from background_loader import BackgroundLoader
+from registration_job import RegistrationJob
+from tick_stats import TickStats
+from track_aggregator import TrackAggregator
+
+
+def load_embedder():
+    """Tạo FaceEmbedding và chạy thử một lần (chạy ở luồng nền khi khởi động)."""
+    embedder = FaceEmbedding()
+    embedder.warm_up()
+    return embedder
+
 
 class FaceAttendanceUI(QWidget):
     def __init__(self):
         super().__init__()
         
-        self.log = pd.DataFrame(columns=["student_id", "student_name", "timestamp", "status"])
-        
         self.pause_api = False
         self.API = APIClient("http://127.0.0.1:8000/")  # Local host
+
+        # Mỗi lần điểm danh được ghi ngay xuống journal trên đĩa; luồng nền upload theo batch.
+        # Sự kiện chưa gửi được (mất mạng, kiosk tắt đột ngột) sẽ được gửi ở lần chạy sau.
+        self.journal = AttendanceJournal(os.environ.get("ATTENDANCE_JOURNAL", "attendance_journal.db"))
+        self.uploader = JournalUploader(self.journal, self.API)
+        self.uploader.start()
+
+        # RECOGNITION_LOCAL=1: nhận diện ngay trên kiosk bằng recognizer tải từ server (cache theo phiên bản),
+        # không còn một round trip HTTP cho mỗi lần nhận diện
+        self.local = None
+        if os.environ.get("RECOGNITION_LOCAL", "0") == "1":
+            self.local = LocalRecognizer(self.API, cache_dir=os.environ.get("RECOGNIZER_CACHE_DIR", "recognizer_cache"))
         
-        try:
-            self.students = self.API.load_json_data()
-        except Exception as e:
-            QMessageBox.critical(self, "Lỗi tải dữ liệu", str(e))
-            self.students = {}
-        
-        base_students = {
-            stu_id: {"name": stu_name, "id": stu_id, "present": False}
-            for stu_id, stu_name in self.students.items()
-        }
-        
+        # Danh sách sinh viên và FaceNet được tải nền sau khi cửa sổ hiện lên (start_background_loading)
+        self.students = {}
         self.current_student_id = None
-        self.attendance = AttendanceManager(base_students)
+        self.attendance = AttendanceManager({})
         # Initialize modules
         self.detector = FaceDetector()
-        self.embedder = FaceEmbedding()
-        
+        # FACE_TRACKING=0 -> phát hiện Haar trên toàn khung hình mỗi tick (để so sánh chi phí)
+        self.tracker = FaceTracker(self.detector) if os.environ.get("FACE_TRACKING", "1") != "0" else None
+        self.tick_stats = TickStats()  # chi phí mỗi tick của update_frame (ms)
+        self.renderer = PreviewRenderer()  # vẽ preview camera vào buffer dựng sẵn
+        self.embedder = None  # FaceEmbedding, sẵn sàng sau khi model_loader xong
+        self.students_loader = None
+        self.model_loader = None
+        
+        # Nhận diện theo track: gom vài khuôn mặt rõ nét của cùng một người rồi mới gọi API
+        # (RECOGNITION_AGGREGATE=average: trung bình embedding, vote: bỏ phiếu trên /predict_batch)
+        self.aggregator = TrackAggregator(mode=os.environ.get("RECOGNITION_AGGREGATE", "average"))
+        self._track_id = 0
+
         # Handle multi threading
-        self._last_embed_time = 0
         self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
         self._future = None
+        self.registration_job = None  # đăng ký khuôn mặt chạy nền
         
         # Camera & timers
-        self.cap = None
+        self.grabber = None  # FrameGrabber (luồng đọc camera)
+        self.detection_worker = None  # DetectionWorker (luồng phát hiện khuôn mặt)
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_frame)
         self.face_detected = False
@@ -68,6 +94,55 @@ class FaceAttendanceUI(QWidget):
         self.apply_color_scheme()
         self.init_ui()
 
+        # Chạy khi vòng lặp sự kiện bắt đầu, tức là sau khi cửa sổ đã được hiển thị
+        QTimer.singleShot(0, self.start_background_loading)
+
+    def start_background_loading(self):
+        """Tải students.json và FaceNet (kèm warm-up) ở luồng nền; giao diện và camera dùng được ngay."""
+        if self.local is not None:
+            self.local.start()
+        self.students_loader = BackgroundLoader(self.load_students, name="load-students")
+        self.students_loader.loaded.connect(self.on_students_loaded)
+        self.students_loader.failed.connect(self.on_students_failed)
+        self.students_loader.start()
+
+        self.model_loader = BackgroundLoader(load_embedder, name="load-facenet")
+        self.model_loader.loaded.connect(self.on_model_loaded)
+        self.model_loader.failed.connect(self.on_model_failed)
+        self.model_loader.start()
+
+    def load_students(self):
+        try:
+            return self.API.load_json_data()
+        except Exception:
+            # Server không truy cập được: chế độ local dùng danh sách sinh viên đã cache cùng recognizer
+            if self.local is not None and (self.local.ready() or self.local.load_cached()):
+                return self.local.students
+            raise
+
+    def on_students_loaded(self, students):
+        self.students = students
+        base_students = {
+            stu_id: {"name": stu_name, "id": stu_id, "present": False}
+            for stu_id, stu_name in self.students.items()
+        }
+        self.attendance = AttendanceManager(base_students)
+        self.update_attendance_list()
+
+    def on_students_failed(self, error):
+        QMessageBox.critical(self, "Lỗi tải dữ liệu", error)
+
+    def on_model_loaded(self, embedder):
+        self.embedder = embedder
+        print(f"FaceNet ready in {self.model_loader.elapsed_s:.2f} s")
+        self.model_status_label.setText(f"✅ Face recognition model ready ({self.model_loader.elapsed_s:.1f} s)")
+        self.model_status_label.setStyleSheet("color: #28A745; padding: 2px;")
+        QTimer.singleShot(3000, lambda: self.model_status_label.setVisible(False))
+
+    def on_model_failed(self, error):
+        self.model_status_label.setText(f"❌ Không thể tải model nhận diện: {error}")
+        self.model_status_label.setStyleSheet("color: #DC3545; padding: 2px;")
+
     def apply_color_scheme(self):
         self.setAutoFillBackground(True)
         palette = self.palette()
@@ -202,6 +277,13 @@ class FaceAttendanceUI(QWidget):
         self.status_label.setTextFormat(Qt.PlainText)
         self.left_layout.addWidget(self.status_label)
 
+        # Trạng thái tải FaceNet ở luồng nền (ẩn đi sau khi model sẵn sàng)
+        self.model_status_label = QLabel("⏳ Loading face recognition model...")
+        self.model_status_label.setAlignment(Qt.AlignCenter)
+        self.model_status_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+        self.model_status_label.setStyleSheet("color: #6C757D; padding: 2px;")
+        self.left_layout.addWidget(self.model_status_label)
+
         # Progress bar with themed colors
         self.progress_bar = QProgressBar(self)
         self.progress_bar.setVisible(False)
@@ -412,21 +494,32 @@ class FaceAttendanceUI(QWidget):
             btn.setFont(btn_font)
 
     def start_camera(self):
-        if not self.cap:
-            self.cap = cv2.VideoCapture(0)
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-        if not self.cap.isOpened():
-            QMessageBox.critical(self, "Camera Error", "Unable to access the camera.")
-            return
+        if not self.grabber:
+            # Camera được đọc ở luồng riêng, chỉ giữ vài khung hình mới nhất; phát hiện khuôn mặt
+            # chạy ở một luồng khác; timer GUI chỉ hiển thị khung hình mới nhất + kết quả mới nhất
+            grabber = FrameGrabber(0, width=1280, height=720)
+            if not grabber.start():
+                grabber.stop()
+                QMessageBox.critical(self, "Camera Error", "Unable to access the camera.")
+                return
+            self.grabber = grabber
+            self.detection_worker = DetectionWorker(grabber, self.detect_largest_face)
+            self.detection_worker.start()
+            self._frame_seq = self._detection_seq = 0
+            self._face = None
         self.hide_idle_animation()
         self.timer.start(30)
 
     def stop_camera(self):
-        if self.cap:
+        if self.grabber:
             self.timer.stop()
-            self.cap.release()
-            self.cap = None
+            self.detection_worker.stop()
+            self.grabber.stop()
+            print("Camera loop:", self.frame_stats())
+            self.grabber = None
+            self.detection_worker = None
+            if self.tracker:
+                self.tracker.reset()
             self.image_label.clear()
             self.show_idle_animation()
 
@@ -437,117 +530,144 @@ class FaceAttendanceUI(QWidget):
             cv2.rectangle(frame, (x,y), (x+w, y+h), (255,123,0), 3)
         return frame, len(faces)
 
+    def detect_largest_face(self, frame):
+        """Chạy trên luồng phát hiện: trả về (khuôn mặt lớn nhất hoặc None, track_id)."""
+        if self.tracker:
+            # Phát hiện đầy đủ định kỳ, giữa các lần đó chỉ tìm quanh khuôn mặt cũ
+            return self.tracker.update(frame), self.tracker.track_id
+        # Detect faces and select the largest one
+        return self.detector.largest_face(frame), None
+
+    def on_detection(self, detection):
+        """Kết quả phát hiện mới (GUI thread): cập nhật track, lấy mẫu khuôn mặt và gửi nhận diện."""
+        largest_face = detection.face
+        track_id = detection.track_id
+        if track_id is None:
+            # Không tracking: mỗi lần khuôn mặt xuất hiện lại được coi là một track mới
+            track_id = self._track_id + 1 if largest_face is not None and not self.face_detected else self._track_id
+        self._track_id = track_id
+        self.face_detected = largest_face is not None
+        self._face = largest_face
+
+        # Người mới trước camera -> bắt đầu gom khuôn mặt lại từ đầu
+        if track_id != self.aggregator.track_id:
+            self.aggregator.reset(track_id)
+            self.aggregator.threshold = self.confidence_threshold()
+            self._response = None
+
+        now = time.time()
+        # Chưa nhận diện khi FaceNet còn đang tải; camera vẫn hiển thị và phát hiện khuôn mặt
+        if not self.pause_api and largest_face and self.embedder is not None:
+            if self.aggregator.wants_sample(now):
+                # Cắt khuôn mặt 160x160 từ đúng khung hình đã phát hiện,
+                # bước embedding dùng lại crop này thay vì detect lại trên cả khung hình
+                self.aggregator.add(self.embedder.face_crop(detection.image, largest_face), now)
+            if self.aggregator.ready(now) and (self._future is None or self._future.done()):
+                self._future = self.executor.submit(self.call_api, *self.aggregator.take_query())
+
     def update_frame(self):
-        if self.cap and self.cap.isOpened():
-            ret, frame = self.cap.read()
-            if ret:
-                # Detect faces and select the largest one
-                faces = self.detector.detect_faces(frame)
-                self.face_detected = len(faces) > 0
-
-                # Find the largest face by area
-                largest_face = None
-                max_area = 0
-                for (x, y, w, h) in faces:
-                    area = w * h
-                    if area > max_area:
-                        max_area = area
-                        largest_face = (x, y, w, h)
-
-                # Draw rectangle only for the largest face
-                if largest_face:
-                    x, y, w, h = largest_face
-                    cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 123, 0), 3)
-                    face_count = 1
+        if not self.grabber:
+            return
+        frame = self.grabber.latest(self._frame_seq)
+        if frame is None:
+            return  # chưa có khung hình mới từ camera
+        self.tick_stats.start()
+        self._frame_seq = frame.seq
+        detection = self.detection_worker.latest(self._detection_seq)
+        if detection is not None:
+            self._detection_seq = detection.seq
+            self.on_detection(detection)
+        largest_face = self._face
+        face_count = 1 if largest_face else 0
+
+        # Kiểm tra nếu có kết quả API đã xong
+        if self._future and self._future.done():
+            try:
+                result_track, response = self._future.result()
+                # Bỏ qua kết quả của track cũ; dừng gọi API khi đã đủ độ tin cậy
+                if self.aggregator.update(result_track, response, time.time()):
+                    self._response = response
+                    self.current_student_id = str(self._response["student_id"]) if self._response else None
+            except Exception as e:
+                print("API error:", e)
+                self._response = None
+            finally:
+                self._future = None
+
+        if self.confirm_face_btn.isVisible() or self.progress_bar.isVisible():
+            if face_count == 0:
+                current_text = "No face detected. Please position your face in the camera."
+                self.set_status(self.format_status_text(current_text), "color: #DC3545; font-weight: bold; padding: 8px; margin: 5px 0;")
+                self._response = None
+                self.confirm_face_btn.setEnabled(False)
+            elif face_count == 1 and hasattr(self, "_response") and self._response:
+                # student = self.attendance.student_data.get(self.attendance.current_student)
+                if self._response["confidence"] < self.confidence_threshold():
+                    current_text = "Unknown face detected..."
+                    self.set_status(self.format_status_text(current_text), "color: #6C757D; font-weight: bold; padding: 8px; margin: 5px 0;")
+                    self.confirm_face_btn.setEnabled(False)
                 else:
-                    face_count = 0
-
-                # Nếu có face và đã qua 5s, submit API call vào thread pool
-                now = time.time()
-                if not self.pause_api and largest_face and (now - self._last_embed_time > 5):
-                    self._last_embed_time = now
-                    if self._future is None or self._future.done():
-                        # copy frame để khỏi race condition
-                        frame_copy = frame.copy()
-                        self._future = self.executor.submit(self.call_api, frame_copy)
-
-                # Kiểm tra nếu có kết quả API đã xong
-                if self._future and self._future.done():
-                    try:
-                        self._response = self._future.result()
-                        self.current_student_id = str(self._response["student_id"]) if self._response else None
-                    except Exception as e:
-                        print("API error:", e)
-                        self._response = None
-                    finally:
-                        self._future = None
-                
-                if self.confirm_face_btn.isVisible() or self.progress_bar.isVisible():
-                    if face_count == 0:
-                        current_text = "No face detected. Please position your face in the camera."
-                        self.status_label.setText(self.format_status_text(current_text))
-                        self.status_label.setStyleSheet("color: #DC3545; font-weight: bold; padding: 8px; margin: 5px 0;")
-                        self._response = None
-                        self.confirm_face_btn.setEnabled(False)
-                    elif face_count == 1 and hasattr(self, "_response") and self._response:
-                        # student = self.attendance.student_data.get(self.attendance.current_student)
-                        if self._response["confidence"] < 2 / len(self.attendance.student_data):
-                            current_text = "Unknown face detected..."
-                            self.status_label.setText(self.format_status_text(current_text))
-                            self.status_label.setStyleSheet("color: #6C757D; font-weight: bold; padding: 8px; margin: 5px 0;")
-                            self.confirm_face_btn.setEnabled(False)
-                        else:
-                            current_text = "Student ID: {} (confidence: {})".format(self._response["student_id"],self._response["confidence"])
-                            self.status_label.setText(self.format_status_text(current_text))
-                            self.status_label.setStyleSheet("color: #28A745; font-weight: bold; padding: 8px; margin: 5px 0;")
-                            self.confirm_face_btn.setEnabled(True)
-                    else:
-                        current_text = "Face detected. Processing..."
-                        self.status_label.setText(self.format_status_text(current_text))
-                        self.status_label.setStyleSheet("color: #007BFF; font-weight: bold; padding: 8px; margin: 5px 0;")
-                        self.confirm_face_btn.setEnabled(False)
-
-                label_size = min(self.image_label.width(), self.image_label.height())
-
-                # Crop to square from center
-                height, width, _ = frame.shape
-                crop_size = min(height, width)
-                center_x, center_y = width // 2, height // 2
-                x1 = center_x - crop_size // 2
-                y1 = center_y - crop_size // 2
-
-                # Ensure crop region is within image bounds
-                x1 = max(0, min(x1, width - crop_size))
-                y1 = max(0, min(y1, height - crop_size))
-
-                try:
-                    square_frame = frame[y1:y1+crop_size, x1:x1+crop_size]
-                    resized_frame = cv2.resize(square_frame, (label_size, label_size))
-                    rgb_image = cv2.cvtColor(resized_frame, cv2.COLOR_BGR2RGB)
-                    qt_image = QImage(
-                        rgb_image.data,
-                        rgb_image.shape[1],
-                        rgb_image.shape[0],
-                        rgb_image.strides[0],
-                        QImage.Format_RGB888
-                    )
-                    pixmap = QPixmap.fromImage(qt_image)
-                    self.image_label.setPixmap(pixmap)
-                except Exception as e:
-                    print(f"Error processing frame: {e}")
-
-    def call_api(self, frame):
-        emb = self.embedder.embedding_face(frame)
-        resp = self.API.predict(emb)
-        return resp.json()
+                    current_text = "Student ID: {} (confidence: {})".format(self._response["student_id"],self._response["confidence"])
+                    self.set_status(self.format_status_text(current_text), "color: #28A745; font-weight: bold; padding: 8px; margin: 5px 0;")
+                    self.confirm_face_btn.setEnabled(True)
+            else:
+                current_text = "Face detected. Processing..."
+                self.set_status(self.format_status_text(current_text), "color: #007BFF; font-weight: bold; padding: 8px; margin: 5px 0;")
+                self.confirm_face_btn.setEnabled(False)
+
+        # Resize vào buffer dựng sẵn theo kích thước label rồi mới vẽ khung khuôn mặt (kết quả phát hiện mới nhất)
+        label_size = min(self.image_label.width(), self.image_label.height())
+        try:
+            pixmap = self.renderer.render(frame.seq, frame.image, largest_face, label_size)
+            if pixmap is not None:
+                self.image_label.setPixmap(pixmap)
+        except Exception as e:
+            print(f"Error processing frame: {e}")
+        self.tick_stats.stop()
+
+    def frame_stats(self):
+        """Chi phí mỗi tick hiển thị, FPS camera / số khung hình cũ bị bỏ và số lần phát hiện đầy đủ / theo ROI."""
+        stats = self.tick_stats.as_dict()
+        if self.grabber:
+            stats.update(self.grabber.as_dict())
+            stats["detections"] = self.detection_worker.stats.count
+            stats["detect_mean_ms"] = self.detection_worker.stats.as_dict()["mean_ms"]
+        stats["rendered"] = self.renderer.rendered
+        stats["render_skipped"] = self.renderer.skipped
+        stats["tracking"] = self.tracker is not None
+        if self.tracker:
+            stats["full_detections"] = self.tracker.full_detections
+            stats["roi_detections"] = self.tracker.roi_detections
+        return stats
+
+    def call_api(self, track_id, crops):
+        predictor = self.local if self.local is not None and self.local.ready() else self.API
+        try:
+            return track_id, self.aggregator.recognise(self.embedder, predictor, crops)
+        except Exception as e:
+            # Báo lỗi cho track để các crop này được gửi lại sau
+            print("API error:", e)
+            return track_id, None
+
+    def confidence_threshold(self):
+        return 2 / max(1, len(self.attendance.student_data))
+
+    def set_status(self, text, style):
+        # Gọi mỗi tick: chỉ cập nhật khi thay đổi (setStyleSheet buộc Qt tính lại style của widget)
+        if self.status_label.text() != text:
+            self.status_label.setText(text)
+        if self.status_label.styleSheet() != style:
+            self.status_label.setStyleSheet(style)
 
     def format_status_text(self, text):
         return text  # Keep full text for simplicity
     
     def show_registration_dialog(self):
+        if self.registration_job is not None and self.registration_job.is_running():
+            QMessageBox.information(self, "Registration Running", "Đang có video được xử lý, vui lòng đợi hoặc huỷ.")
+            return
+
         # Mở dialog để người dùng chọn nhiều video
-        prep_df = pd.DataFrame(columns=range(513))  # 512 cho embedding + 1 cho student_id
-        
         video_paths, _ = QFileDialog.getOpenFileNames(
             self,
             "Select Face Videos",
@@ -558,17 +678,7 @@ class FaceAttendanceUI(QWidget):
             QMessageBox.warning(self, "Missing Videos", "Bạn phải chọn ít nhất một video.")
             return
 
-        msg_box = QMessageBox(self)
-        msg_box.setWindowTitle("Processing Videos")
-        msg_box.setText("Video đang được xử lý...\n(Vui lòng KHÔNG tắt ứng dụng)")
-        msg_box.setStandardButtons(QMessageBox.NoButton)
-        msg_box.setIcon(QMessageBox.Information)
-        msg_box.setStyleSheet("QLabel{min-width:300px; min-height:60px; font-size:14px;}")
-        msg_box.show()
-        QApplication.processEvents()  # Ensure the message box is rendered immediately
-        
-        preprocessing = Processing_Img(self.students)
-        
+        videos = []
         for src_path in video_paths:
             base_name = os.path.basename(src_path)
             name_no_ext = os.path.splitext(base_name)[0]
@@ -577,6 +687,7 @@ class FaceAttendanceUI(QWidget):
                 student_id, student_name = name_no_ext.split('_', 1)
                 if not student_name:
                     raise ValueError("Tên không được để trống")
+                int(student_id)
             except ValueError as e:
                 QMessageBox.warning(
                     self,
@@ -584,30 +695,60 @@ class FaceAttendanceUI(QWidget):
                     f"Bỏ qua '{base_name}': {e}\nĐịnh dạng phải là ID_Name"
                 )
                 continue
-
-            try:
-                df = preprocessing.frame_to_vector(src_path, student_id, student_name)
-                prep_df = pd.concat([prep_df, df], ignore_index=True)
-            except Exception as ex:
-                QMessageBox.warning(
-                    self,
-                    "Error in Processing",
-                    f"Không thể xử lý video '{base_name}': {ex}"
-                )
+            if student_id in self.students:
+                print(f"Đã tồn tại student_id {student_id} trong danh sách sinh viên.")
                 continue
-        
-        # Lưu DataFrame vào tệp CSV
-        if not prep_df.empty:
-            # Gọi API với dữ liệu đã chuyển đổi
-            try:
-                self.API.push_data(prep_df)
-                # Cập nhật dữ liệu JSON
-                self.API.push_json_data(self.students)
-            except Exception as e:
-                QMessageBox.critical(self, "API Error", f"Không thể gửi dữ liệu đến API: {e}")
-        
-        msg_box.setText(f"Video đã được xử lý xong (Done)")
-        QTimer.singleShot(2000, msg_box.accept)
+            videos.append((src_path, student_id, student_name))
+        if not videos:
+            return
+
+        # Xử lý ở tiến trình nền: camera và giao diện vẫn hoạt động trong lúc chờ
+        self.registration_job = job = RegistrationJob(self.API, videos, self.students)
+        self._registration_progress = {path: 0.0 for path, _, _ in videos}
+        self._registration_errors = []
+        self.registration_dialog = QProgressDialog("Video đang được xử lý...", "Huỷ", 0, 100, self)
+        self.registration_dialog.setWindowTitle("Processing Videos")
+        self.registration_dialog.setWindowModality(Qt.NonModal)
+        self.registration_dialog.setAutoClose(False)
+        self.registration_dialog.setAutoReset(False)
+        self.registration_dialog.setMinimumDuration(0)
+        self.registration_dialog.setValue(0)
+        self.registration_dialog.canceled.connect(job.cancel)
+        job.progress.connect(self.on_registration_progress)
+        job.video_failed.connect(self.on_registration_video_failed)
+        job.finished.connect(self.on_registration_finished)
+        job.failed.connect(self.on_registration_failed)
+        job.cancelled.connect(self.on_registration_cancelled)
+        self.registration_dialog.show()
+        job.start()
+
+    def on_registration_progress(self, video_path, done, total):
+        self._registration_progress[video_path] = min(done / total, 1.0) if total else 0.0
+        value = sum(self._registration_progress.values()) / len(self._registration_progress)
+        self.registration_dialog.setValue(int(value * 100))
+        self.registration_dialog.setLabelText(f"Đang xử lý {os.path.basename(video_path)} ({done}/{total or '?'} khung hình)")
+
+    def on_registration_video_failed(self, video_path, error):
+        self._registration_errors.append(f"{os.path.basename(video_path)}: {error}")
+        self._registration_progress[video_path] = 1.0
+
+    def on_registration_finished(self, new_students, rows):
+        self.students.update(new_students)
+        text = f"Video đã được xử lý xong (Done): {len(new_students)} sinh viên, {rows} embedding."
+        if self._registration_errors:
+            text += "\nKhông thể xử lý:\n" + "\n".join(self._registration_errors)
+        self.registration_dialog.setValue(100)
+        self.registration_dialog.setLabelText(text)
+        self.registration_dialog.setCancelButtonText("Đóng")
+        QTimer.singleShot(3000 if not self._registration_errors else 10000, self.registration_dialog.close)
+
+    def on_registration_failed(self, error):
+        self.registration_dialog.close()
+        QMessageBox.critical(self, "API Error", f"Không thể gửi dữ liệu đến API: {error}")
+
+    def on_registration_cancelled(self):
+        self.registration_dialog.close()
+        self.status_label.setText("Đã huỷ đăng ký khuôn mặt.")
 
     def take_attendance(self):
         # self.back_btn.setVisible(True)
@@ -615,7 +756,10 @@ class FaceAttendanceUI(QWidget):
         self.progress_bar.setValue(0)
         self.confirm_face_btn.setVisible(False)
         self.retry_face_btn.setVisible(False)
-        self.API.load_model()
+        if self.local is not None:
+            self.local.wake()  # kiểm tra phiên bản mới ở nền, không chặn giao diện
+        else:
+            self.API.load_model()
         self.start_camera()
         self.progress_timer = QTimer(self)
         self.progress_timer.timeout.connect(lambda: self.progress_bar.setValue(self.progress_bar.value()+1))
@@ -667,7 +811,12 @@ class FaceAttendanceUI(QWidget):
             "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
             "status": 1
         }
-        self.log = pd.concat([self.log, pd.DataFrame([log_entry])], ignore_index=True)
+        self.record_attendance(log_entry)
+
+    def record_attendance(self, log_entry):
+        """Ghi một lần điểm danh vào journal (bền vững ngay) và báo luồng upload."""
+        self.journal.append(log_entry)
+        self.uploader.wake()
 
     def retry_wrong_face(self):
         # 1. Tạm dừng việc gọi API
@@ -702,7 +851,7 @@ class FaceAttendanceUI(QWidget):
                 "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
                 "status": 0
             }
-            self.log = pd.concat([self.log, pd.DataFrame([log_entry])], ignore_index=True)
+            self.record_attendance(log_entry)
         else:
             # Nếu mã sinh viên không hợp lệ, thông báo lỗi bằng message box
             QMessageBox.warning(
@@ -728,21 +877,16 @@ class FaceAttendanceUI(QWidget):
         self.update_font_sizes()
     
     def closeEvent(self, event):
-        if self.cap:
+        if self.grabber:
             self.stop_camera()
-        
-        # Hiển thị thanh loading khi gửi log
-        msg_box = QMessageBox(self)
-        msg_box.setWindowTitle("Uploading Log")
-        msg_box.setText("Đang gửi dữ liệu điểm danh lên server...\n(Vui lòng đợi trong giây lát)")
-        msg_box.setStandardButtons(QMessageBox.NoButton)
-        msg_box.setIcon(QMessageBox.Information)
-        msg_box.setStyleSheet("QLabel{min-width:300px; min-height:60px; font-size:14px;}")
-        msg_box.show()
-        QApplication.processEvents()  # Đảm bảo message box hiển thị ngay
-
-        self.API.push_log(self.log)
-
-        msg_box.setText("Đã gửi dữ liệu thành công! (Done)")
-        QTimer.singleShot(2000, msg_box.accept)
+        if self.registration_job is not None and self.registration_job.is_running():
+            self.registration_job.cancel()
+        
+        # Log đã được upload dần trong phiên; chỉ còn gửi nốt các sự kiện cuối (nếu có)
+        if not self.uploader.stop():
+            print(f"{self.journal.pending_count()} attendance events not uploaded yet "
+                  f"({self.uploader.last_error}); they are kept in {self.journal.path} and sent on next start.")
+        self.journal.close()
+        if self.local is not None:
+            self.local.stop()
         event.accept()
\ No newline at end of file
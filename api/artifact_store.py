@@ -0,0 +1,351 @@
+"""
+Artifact store backends shared by the API, the retrain scripts and the dashboard.
+
+ARTIFACT_STORE=wandb (default) keeps using Weights & Biases artifacts.
+ARTIFACT_STORE=local uses a content-addressed store on the filesystem (ARTIFACT_STORE_ROOT):
+
+    objects/<sha[:2]>/<sha>          read-only file blobs, stored once per content
+    manifests/<name>/v<N>.json       {"version", "digest", "files": {filename: sha}, ...}
+    manifests/<name>/latest          text pointer to the latest version
+    checkout/<name>/<digest>/        hardlinks to the blobs, returned by download()
+
+Resolving and downloading a local artifact is a stat of the checkout directory, plus one
+hardlink per file the first time a version is checked out.
+
+Seed a local store from existing files (e.g. on an air-gapped box):
+    python api/artifact_store.py log model_export model_export --type inference_artifact
+    python api/artifact_store.py ls
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+PROJECT = "attendance_face_recognition"
+
+
+class ArtifactNotFound(Exception):
+    """Raised when an artifact (or one of its files) does not exist in the store."""
+
+
+def parse_name(name):
+    """'project/name:alias' -> (name, alias); alias mặc định là 'latest'."""
+    name = name.rsplit("/", 1)[-1]
+    name, _, alias = name.partition(":")
+    return name, alias or "latest"
+
+
+def link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ArtifactStore:
+    """Common interface; use_artifact() returns an object with version, digest and download(root=None)."""
+    run = None
+
+    def use_artifact(self, name):
+        raise NotImplementedError
+
+    def log_artifact(self, name, files, type, description=None, wait=False):
+        raise NotImplementedError
+
+    def update_artifact(self, name, add, remove=(), type="data", description=None, wait=False):
+        """Publishes a new version made of the latest version's files, minus the filenames in `remove`,
+        plus the files in `add` (replacing same-named ones); only the `add` files are uploaded."""
+        raise NotImplementedError
+
+    def download(self, name, root=None):
+        """Returns a local directory containing the files of the artifact."""
+        return self.use_artifact(name).download(root=root)
+
+    def fetch_file(self, name, filename, dest):
+        """Copies one file of the artifact to `dest`, replacing it atomically."""
+        path = os.path.join(self.download(name), filename)
+        if not os.path.exists(path):
+            raise ArtifactNotFound(f"{filename} not found in artifact {name}")
+        os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+        tmp = f"{dest}.{os.getpid()}.tmp"
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, dest)
+        return dest
+
+    def finish(self):
+        pass
+
+
+class LocalArtifact:
+    def __init__(self, store, manifest):
+        self.store = store
+        self.name = manifest["name"]
+        self.version = manifest["version"]
+        self.digest = manifest["digest"]
+        self.type = manifest.get("type")
+        self.description = manifest.get("description")
+        self.files = manifest["files"]
+
+    def download(self, root=None):
+        target = root or os.path.join(self.store.root, "checkout", self.name, self.digest)
+        if all(os.path.exists(os.path.join(target, f)) for f in self.files):
+            return target
+        if root is not None:
+            os.makedirs(target, exist_ok=True)
+            for filename, sha in self.files.items():
+                if not os.path.exists(os.path.join(target, filename)):
+                    link_or_copy(self.store.object_path(sha), os.path.join(target, filename))
+            return target
+        # Checkout trong thư mục tạm rồi đổi tên, để không ai thấy checkout dở dang
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=os.path.dirname(target), prefix=".checkout-")
+        for filename, sha in self.files.items():
+            link_or_copy(self.store.object_path(sha), os.path.join(tmp, filename))
+        try:
+            os.replace(tmp, target)
+        except OSError:
+            # Một tiến trình khác đã checkout cùng digest trước
+            shutil.rmtree(tmp, ignore_errors=True)
+        return target
+
+
+class LocalArtifactStore(ArtifactStore):
+    """Content-addressed filesystem store; see the module docstring for the layout."""
+    def __init__(self, root="artifact_store"):
+        self.root = root
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "manifests"), exist_ok=True)
+
+    def object_path(self, sha):
+        return os.path.join(self.root, "objects", sha[:2], sha)
+
+    def _manifest_dir(self, name):
+        return os.path.join(self.root, "manifests", name)
+
+    def _write_atomic(self, path, text):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+    def _put_object(self, path):
+        sha = file_sha256(path)
+        dest = self.object_path(sha)
+        if not os.path.exists(dest):
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            tmp = f"{dest}.{os.getpid()}.tmp"
+            shutil.copyfile(path, tmp)
+            os.chmod(tmp, 0o444)  # blob được hardlink ra checkout, không được sửa tại chỗ
+            os.replace(tmp, dest)
+        return sha
+
+    def resolve(self, name):
+        """Returns the manifest of 'name:alias' (alias = latest or vN)."""
+        name, alias = parse_name(name)
+        manifest_dir = self._manifest_dir(name)
+        if alias == "latest":
+            try:
+                with open(os.path.join(manifest_dir, "latest"), encoding="utf-8") as f:
+                    alias = f.read().strip()
+            except FileNotFoundError:
+                raise ArtifactNotFound(f"Artifact {name} does not exist")
+        try:
+            with open(os.path.join(manifest_dir, f"{alias}.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ArtifactNotFound(f"Artifact {name}:{alias} does not exist")
+
+    def use_artifact(self, name):
+        return LocalArtifact(self, self.resolve(name))
+
+    def log_artifact(self, name, files, type, description=None, wait=False):
+        """Stores the files and publishes a new version (re-logging identical content is a no-op)."""
+        name, _ = parse_name(name)
+        entries = {os.path.basename(path): self._put_object(path) for path in files}
+        return self._publish(name, entries, type, description)
+
+    def update_artifact(self, name, add, remove=(), type="data", description=None, wait=False):
+        name, _ = parse_name(name)
+        try:
+            entries = dict(self.resolve(name)["files"])
+        except ArtifactNotFound:
+            entries = {}
+        for filename in remove:
+            entries.pop(filename, None)
+        for path in add:
+            entries[os.path.basename(path)] = self._put_object(path)
+        return self._publish(name, entries, type, description)
+
+    def _publish(self, name, entries, type, description=None):
+        digest = hashlib.sha256(json.dumps(entries, sort_keys=True).encode("utf-8")).hexdigest()
+        try:
+            latest = self.resolve(name)
+            if latest["digest"] == digest:
+                return LocalArtifact(self, latest)
+        except ArtifactNotFound:
+            pass
+
+        manifest_dir = self._manifest_dir(name)
+        os.makedirs(manifest_dir, exist_ok=True)
+        index = sum(1 for f in os.listdir(manifest_dir) if f.startswith("v") and f.endswith(".json"))
+        while True:
+            version = f"v{index}"
+            try:
+                # O_EXCL để hai tiến trình ghi song song không lấy trùng số phiên bản
+                fd = os.open(os.path.join(manifest_dir, f"{version}.json"), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                index += 1
+        manifest = {
+            "name": name, "version": version, "digest": digest, "type": type,
+            "description": description, "files": entries, "created_at": time.time(),
+        }
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        self._write_atomic(os.path.join(manifest_dir, "latest"), version)
+        return LocalArtifact(self, manifest)
+
+    def list_artifacts(self):
+        root = os.path.join(self.root, "manifests")
+        return {name: self.resolve(name) for name in sorted(os.listdir(root))}
+
+
+class WandbArtifactStore(ArtifactStore):
+    """Weights & Biases backend, equivalent to the direct run.use_artifact / run.log_artifact calls."""
+    def __init__(self, project=PROJECT, job_type="api", run=None):
+        import wandb
+        self._wandb = wandb
+        self.run = run or wandb.init(project=project, job_type=job_type)
+
+    def use_artifact(self, name):
+        try:
+            return self.run.use_artifact(name)
+        except self._wandb.errors.CommError as e:
+            raise ArtifactNotFound(str(e)) from e
+
+    def download(self, name, root=None):
+        try:
+            return self.use_artifact(name).download(root=root)
+        except self._wandb.errors.CommError as e:
+            raise ArtifactNotFound(str(e)) from e
+
+    def log_artifact(self, name, files, type, description=None, wait=False):
+        artifact = self._wandb.Artifact(name=name, type=type, description=description)
+        for path in files:
+            artifact.add_file(path)
+        self.run.log_artifact(artifact)
+        if wait:
+            artifact.wait()
+        return artifact
+
+    def update_artifact(self, name, add, remove=(), type="data", description=None, wait=False):
+        try:
+            # Bản nháp từ phiên bản mới nhất: các file không đổi được tham chiếu lại, không upload lại
+            artifact = self.run.use_artifact(f"{name}:latest").new_draft()
+        except self._wandb.errors.CommError:
+            artifact = self._wandb.Artifact(name=name, type=type, description=description)
+        for filename in set(remove) | {os.path.basename(path) for path in add}:
+            if filename in artifact.manifest.entries:
+                artifact.remove(filename)
+        for path in add:
+            artifact.add_file(path)
+        self.run.log_artifact(artifact)
+        if wait:
+            artifact.wait()
+        return artifact
+
+    def finish(self):
+        self.run.finish()
+
+
+class BackgroundPublisher:
+    """
+    Daemon thread that periodically runs `target.maintain()` and publishes `target` to the
+    artifact store whenever `target.dirty` is set. Call wake() after a change to publish early.
+    """
+    def __init__(self, target, store=None, interval_s=30.0, name="publisher"):
+        self.target = target
+        self.store = store
+        self.interval_s = interval_s
+        self.name = name
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.interval_s)
+            self._wakeup.clear()
+            try:
+                self.target.maintain()
+                if self.store is not None and self.target.dirty:
+                    self.target.publish(self.store)
+            except Exception as e:
+                print(f"-- {self.name} maintenance failed: {e} --")
+                self.target.dirty = True
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self):
+        """Stops the thread and publishes any change that is still pending."""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        if self.store is not None and self.target.dirty:
+            self.target.publish(self.store)
+
+
+def get_store(job_type="api", backend=None, root=None):
+    """Creates the store selected by ARTIFACT_STORE (wandb | local) and ARTIFACT_STORE_ROOT."""
+    backend = backend or os.environ.get("ARTIFACT_STORE", "wandb")
+    if backend == "local":
+        return LocalArtifactStore(root or os.environ.get("ARTIFACT_STORE_ROOT", "artifact_store"))
+    if backend == "wandb":
+        return WandbArtifactStore(job_type=job_type)
+    raise ValueError(f"Unknown ARTIFACT_STORE backend: {backend}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default=os.environ.get("ARTIFACT_STORE_ROOT", "artifact_store"))
+    sub = parser.add_subparsers(dest="command", required=True)
+    log = sub.add_parser("log", help="Publish files as a new version of an artifact")
+    log.add_argument("name")
+    log.add_argument("files", nargs="+")
+    log.add_argument("--type", default="data")
+    log.add_argument("--description")
+    sub.add_parser("ls", help="List artifacts and their latest version")
+    args = parser.parse_args()
+
+    store = LocalArtifactStore(args.root)
+    if args.command == "log":
+        artifact = store.log_artifact(args.name, args.files, type=args.type, description=args.description)
+        print(f"{artifact.name}:{artifact.version} {artifact.digest[:12]}")
+    else:
+        for name, manifest in store.list_artifacts().items():
+            print(f"{name}:{manifest['version']} {manifest['digest'][:12]} {', '.join(manifest['files'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import asyncio
+import collections
+import concurrent.futures
+import time
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Asyncio micro-batcher placed in front of the model.
+    Concurrent requests are collected for up to max_wait_ms (or until max_batch_size is reached),
+    inferred together in a worker thread and the results are fanned back to every waiting request.
+    The wait window is only used under load: a lone request on an idle server is dispatched at once.
+    """
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=2.0):
+        '''
+        Args:
+            predict_fn (callable): Hàm nhận ma trận (N, 512) float32, trả về list N kết quả theo thứ tự.
+            max_batch_size (int): Số request tối đa trong một batch.
+            max_wait_ms (float): Thời gian tối đa (ms) chờ gom thêm request khi đang có tải.
+        '''
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending = collections.deque()
+        self._wakeup = None
+        self._task = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        # Metrics
+        self._requests = 0
+        self._batches = 0
+        self._last_batch_size = 0
+        self._max_queue_depth = 0
+        self._batch_sizes = collections.Counter()
+        self._inference_seconds = 0.0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for _, future in self._pending:
+            if not future.done():
+                future.cancel()
+        self._pending.clear()
+
+    async def run(self, X):
+        """Runs predict_fn on a request that is already a batch, in the inference thread (not queued)."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.predict_fn, X)
+
+    async def submit(self, embedding):
+        """Queues one embedding and waits for its prediction."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((embedding, future))
+        self._max_queue_depth = max(self._max_queue_depth, len(self._pending))
+        self._wakeup.set()
+        return await future
+
+    async def _collect(self):
+        """Waits for the window to fill; returns early once max_batch_size requests are queued."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(self._pending) < self.max_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            under_load = self._last_batch_size > 1 or len(self._pending) > 1
+            if self.max_wait > 0 and under_load:
+                await self._collect()
+
+            batch = []
+            while self._pending and len(batch) < self.max_batch_size:
+                embedding, future = self._pending.popleft()
+                if not future.done():  # bỏ qua request đã bị huỷ (client ngắt kết nối)
+                    batch.append((embedding, future))
+            if not batch:
+                continue
+
+            X = np.asarray([embedding for embedding, _ in batch], dtype=np.float32)
+            start = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self._executor, self.predict_fn, X)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            self._inference_seconds += time.perf_counter() - start
+            self._requests += len(batch)
+            self._batches += 1
+            self._last_batch_size = len(batch)
+            self._batch_sizes[len(batch)] += 1
+
+    def metrics(self):
+        return {
+            "queue_depth": len(self._pending),
+            "max_queue_depth": self._max_queue_depth,
+            "requests": self._requests,
+            "batches": self._batches,
+            "last_batch_size": self._last_batch_size,
+            "mean_batch_size": round(self._requests / self._batches, 2) if self._batches else 0.0,
+            "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+            "mean_inference_ms": round(self._inference_seconds / self._batches * 1000, 3) if self._batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+        }
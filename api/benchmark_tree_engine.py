@@ -0,0 +1,74 @@
+"""
+Parity check and micro-benchmark of CompiledForest against sklearn's RandomForestClassifier.
+
+Usage (from the repository root):
+    python api/benchmark_tree_engine.py --model model_export --embeddings data/vector_embedding
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import warnings
+
+import joblib
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from tree_engine import CompiledForest
+
+
+def load_embeddings(embedding_dir, n_random=256, seed=42):
+    """Loads the stored *.npy embeddings and appends random vectors to cover off-distribution inputs."""
+    arrays = [np.load(path).astype(np.float32) for path in sorted(glob.glob(os.path.join(embedding_dir, "*.npy")))]
+    rng = np.random.default_rng(seed)
+    arrays.append(rng.normal(0.0, 0.05, size=(n_random, 512)).astype(np.float32))
+    return np.concatenate(arrays)
+
+
+def check_parity(model, engine, X):
+    """Compares probabilities, labels and the rounded confidence returned by /predict."""
+    ref_proba = model.predict_proba(X)
+    new_proba = engine.predict_proba(X)
+    max_err = float(np.abs(ref_proba - new_proba).max())
+    same_label = np.array_equal(model.classes_[ref_proba.argmax(axis=1)], engine.classes_[new_proba.argmax(axis=1)])
+    same_conf = np.array_equal(np.round(ref_proba.max(axis=1), 2), np.round(new_proba.max(axis=1), 2))
+    print(f"Parity on {len(X)} samples: max |proba diff| = {max_err:.2e}, labels equal = {same_label}, confidence equal = {same_conf}")
+    return max_err < 1e-9 and same_label and same_conf
+
+
+def time_call(fn, X, repeat):
+    fn(X)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(X)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="model_export", help="Path to the joblib model_export file")
+    parser.add_argument("--embeddings", default=os.path.join("data", "vector_embedding"), help="Directory of *.npy embeddings")
+    parser.add_argument("--batch-sizes", default="1,8,64", help="Comma separated batch sizes")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed calls per batch size")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    model = joblib.load(args.model)
+    engine = CompiledForest.from_sklearn(model)
+    X = load_embeddings(args.embeddings)
+
+    ok = check_parity(model, engine, X)
+
+    print(f"{'batch':>6} {'sklearn (ms)':>14} {'compiled (ms)':>14} {'speed-up':>9}")
+    for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+        batch = X[:batch_size]
+        ref_ms = time_call(model.predict_proba, batch, args.repeat)
+        new_ms = time_call(engine.predict_proba, batch, args.repeat)
+        print(f"{batch_size:>6} {ref_ms:>14.3f} {new_ms:>14.3f} {ref_ms / new_ms:>8.1f}x")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Binary embedding store with one float32 shard per student.
+
+    <root>/manifest.json                    {"dim": 512, "students": {student_id: {"file", "rows", "updated_at"}},
+                                             "retired": [{"file", "retired_at"}]}
+    <root>/shards/<student_id>.<rev>.npy    (rows, 512) float32, same format as data/vector_embedding/*.npy
+
+Enrolling a student writes a new revision of only that student's shard and then swaps the manifest.
+Shard files are never modified in place, so a manifest snapshot always matches the files it names;
+replaced revisions are retired and deleted after a grace period (and once no longer part of the
+last published version). Readers memory-map the shards (np.load(mmap_mode="r")), so the gallery is
+available without a CSV parse.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from artifact_store import BackgroundPublisher, link_or_copy
+
+MANIFEST = "manifest.json"
+DIM = 512
+
+
+def iter_shards(directory, manifest):
+    """Yields (student_id, memory-mapped (rows, 512) float32 array) for every shard of a manifest."""
+    for student_id, entry in sorted(manifest["students"].items(), key=lambda item: int(item[0])):
+        yield int(student_id), np.load(os.path.join(directory, entry["file"]), mmap_mode="r")
+
+
+def shards_to_frame(shards):
+    """(student_id, (rows, 512)) pairs -> DataFrame in the embedding_data.csv layout."""
+    shards = list(shards)
+    X = np.concatenate([X for _, X in shards]) if shards else np.empty((0, DIM), dtype=np.float32)
+    y = np.concatenate([np.full(len(X), sid, dtype=np.int64) for sid, X in shards]) if shards else np.empty(0, dtype=np.int64)
+    df = pd.DataFrame(X, columns=[str(i) for i in range(DIM)])
+    df[str(DIM)] = y
+    return df
+
+
+def iter_csv_bytes(shards, chunk_rows=4096):
+    """Streams shards in the embedding_data.csv layout, `chunk_rows` rows at a time, without building the full frame."""
+    yield (",".join(str(i) for i in range(DIM + 1)) + "\n").encode("utf-8")
+    for student_id, X in shards:
+        for start in range(0, len(X), chunk_rows):
+            chunk = shards_to_frame([(student_id, np.asarray(X[start:start + chunk_rows]))])
+            yield chunk.to_csv(header=False, index=False).encode("utf-8")
+
+
+def load_frame(directory):
+    """Reads a downloaded `embedding_shards` artifact (manifest and shards side by side)."""
+    with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    return shards_to_frame(iter_shards(directory, manifest))
+
+
+class EmbeddingStore:
+    def __init__(self, root="embedding_store", retire_grace_s=600):
+        '''
+        Args:
+            root (str): Thư mục chứa manifest và các shard .npy của từng sinh viên.
+            retire_grace_s (float): Thời gian giữ revision shard cũ trước khi xoá.
+        '''
+        self.root = root
+        self.shard_dir = os.path.join(root, "shards")
+        self.retire_grace_s = retire_grace_s
+        self._lock = threading.Lock()
+        self._publisher = None
+        self._published = set()  # các file shard của phiên bản đã publish gần nhất
+        self.dirty = False  # có thay đổi chưa publish lên artifact store
+        os.makedirs(self.shard_dir, exist_ok=True)
+        try:
+            with open(os.path.join(root, MANIFEST), encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {"dim": DIM, "students": {}}
+
+    def _save_manifest(self, manifest):
+        path = os.path.join(self.root, MANIFEST)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, path)
+        self.manifest = manifest
+
+    def __len__(self):
+        return len(self.manifest["students"])
+
+    def __contains__(self, student_id):
+        return str(int(student_id)) in self.manifest["students"]
+
+    @property
+    def etag(self):
+        """Version tag of the current contents; changes whenever a shard is written or restored."""
+        students = json.dumps(self.manifest["students"], sort_keys=True).encode("utf-8")
+        return hashlib.sha256(students).hexdigest()[:32]
+
+    @property
+    def row_count(self):
+        return sum(entry["rows"] for entry in self.manifest["students"].values())
+
+    def shard_path(self, student_id, rev):
+        return os.path.join(self.shard_dir, f"{student_id}.{rev}.npy")
+
+    def load(self, student_id, mmap=True):
+        """Returns the (rows, 512) float32 shard of one student."""
+        entry = self.manifest["students"][str(int(student_id))]
+        return np.load(os.path.join(self.shard_dir, entry["file"]), mmap_mode="r" if mmap else None)
+
+    def iter_shards(self):
+        return iter_shards(self.shard_dir, self.manifest)
+
+    def put(self, student_id, X, append=True):
+        """Writes one student's shard; with append=True the new rows are added to the existing ones.
+        Args:
+            student_id (int): Mã sinh viên.
+            X (np.ndarray): Ma trận (rows, 512) embedding mới.
+            append (bool): Nối vào shard cũ (nếu có) thay vì ghi đè.
+        Returns:
+            dict: Mục manifest của sinh viên.
+        """
+        student_id = int(student_id)
+        X = np.ascontiguousarray(X, dtype=np.float32).reshape(-1, DIM)
+        if append and student_id in self:
+            X = np.concatenate([self.load(student_id, mmap=False), X])
+        # Mỗi lần ghi là một file mới: không ghi đè shard mà một manifest khác đang trỏ tới
+        path = self.shard_path(student_id, time.time_ns())
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, X)
+        os.replace(tmp, path)
+        entry = {"file": os.path.basename(path), "rows": len(X), "updated_at": time.time()}
+        with self._lock:
+            students = dict(self.manifest["students"])
+            old = students.get(str(student_id))
+            students[str(student_id)] = entry
+            retired = list(self.manifest.get("retired", []))
+            if old is not None and old["file"] != entry["file"]:
+                retired.append({"file": old["file"], "retired_at": time.time()})
+            self._save_manifest(dict(self.manifest, students=students, retired=retired))
+            self.dirty = True
+        if self._publisher is not None:
+            self._publisher.wake()
+        return entry
+
+    def import_frame(self, df):
+        """Imports the embedding_data.csv layout (512 features + label), one shard per student."""
+        labels = df.iloc[:, DIM].to_numpy(dtype=np.int64)
+        X = df.iloc[:, :DIM].to_numpy(dtype=np.float32)
+        for student_id in np.unique(labels):
+            self.put(student_id, X[labels == student_id], append=False)
+
+    def to_frame(self):
+        return shards_to_frame(self.iter_shards())
+
+    def iter_csv(self, chunk_rows=4096):
+        return iter_csv_bytes(self.iter_shards(), chunk_rows)
+
+    # --- Artifact store ---
+    def publish(self, store, name="embedding_shards"):
+        """Logs manifest + shards as one artifact version; unchanged shards are deduplicated by the store."""
+        with self._lock:
+            manifest = self.manifest
+            self.dirty = False
+        files = [os.path.join(self.shard_dir, entry["file"]) for entry in manifest["students"].values()]
+        # Upload bản chụp manifest: put() song song có thể đã trỏ file trên đĩa tới shard chưa được upload
+        with tempfile.TemporaryDirectory(prefix=".publish-", dir=self.root) as scratch:
+            snapshot = os.path.join(scratch, MANIFEST)
+            with open(snapshot, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+            store.log_artifact(name, files + [snapshot], type="data")
+        self._published = {entry["file"] for entry in manifest["students"].values()}
+        self.collect_retired()
+
+    def collect_retired(self):
+        """Deletes retired shard revisions older than retire_grace_s that the last published version does not use."""
+        with self._lock:
+            retired = self.manifest.get("retired", [])
+            keep = []
+            for item in retired:
+                if time.time() - item["retired_at"] > self.retire_grace_s and item["file"] not in self._published:
+                    try:
+                        os.remove(os.path.join(self.shard_dir, item["file"]))
+                    except FileNotFoundError:
+                        pass
+                else:
+                    keep.append(item)
+            if len(keep) != len(retired):
+                self._save_manifest(dict(self.manifest, retired=keep))
+
+    def restore(self, directory):
+        """Initialises an empty store from a downloaded `embedding_shards` artifact directory."""
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+        for entry in manifest["students"].values():
+            dest = os.path.join(self.shard_dir, entry["file"])
+            if not os.path.exists(dest):
+                link_or_copy(os.path.join(directory, entry["file"]), dest)
+        with self._lock:
+            self._save_manifest(dict(manifest, retired=[]))
+            self._published = {entry["file"] for entry in manifest["students"].values()}
+
+    # --- Background publishing ---
+    def maintain(self):
+        self.collect_retired()
+
+    def start_background(self, store=None, interval_s=30.0):
+        if self._publisher is None:
+            self._publisher = BackgroundPublisher(self, store, interval_s, name="embedding-store")
+        self._publisher.start()
+
+    def stop_background(self):
+        if self._publisher is not None:
+            self._publisher.stop()
+            self._publisher = None
@@ -0,0 +1,143 @@
+"""
+On-disk cache of encoded downloads, keyed by content version (ETag) and Content-Encoding.
+
+    <root>/<etag>.<suffix>.<encoding>        e.g. 3f2a....csv.identity, 3f2a....csv.gzip, 3f2a....csv.zstd
+
+The first request for a version streams the encoded bytes to the client while writing them to
+the cache; later requests (and every Range request) are served from the cached file, so
+HTTP Range / If-Range work on a stable byte sequence. Only the newest `keep` versions are kept.
+zstd is used only when the optional `zstandard` package is installed.
+"""
+import os
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def available_encodings():
+    return ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+
+
+def negotiate_encoding(accept_encoding):
+    """Picks zstd, gzip or identity from an Accept-Encoding header (q=0 disables a coding)."""
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = q
+    for coding in available_encodings():
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return "identity"
+
+
+def encode_chunks(chunks, encoding):
+    """Compresses a byte-chunk iterator on the fly."""
+    if encoding == "identity":
+        yield from chunks
+        return
+    if encoding == "gzip":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+    elif encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    else:
+        raise ValueError(f"Unsupported encoding: {encoding}")
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def etag_matches(if_none_match, etag):
+    """Weak If-None-Match comparison; `etag` is the bare version, the header may carry an encoding suffix."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        tag = tag[2:] if tag.startswith("W/") else tag
+        tag = tag.strip('"')
+        if tag == etag or tag.rsplit("-", 1)[0] == etag:
+            return True
+    return False
+
+
+class ExportCache:
+    def __init__(self, root="export_cache", suffix="csv", keep=2):
+        '''
+        Args:
+            root (str): Thư mục chứa các file đã encode.
+            suffix (str): Phần mở rộng của dữ liệu gốc (chỉ để dễ nhận biết file).
+            keep (int): Số phiên bản (etag) mới nhất được giữ lại.
+        '''
+        self.root = root
+        self.suffix = suffix
+        self.keep = keep
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, etag, encoding):
+        return os.path.join(self.root, f"{etag}.{self.suffix}.{encoding}")
+
+    def get(self, etag, encoding):
+        path = self.path(etag, encoding)
+        return path if os.path.exists(path) else None
+
+    def stream(self, etag, encoding, chunks, is_current=None):
+        """Yields the encoded bytes and commits them to the cache once the stream completes.
+        Args:
+            etag (str): Phiên bản của dữ liệu đang được stream.
+            encoding (str): "identity", "gzip" hoặc "zstd".
+            chunks (iterator): Các khối bytes chưa encode.
+            is_current (callable): Trả về False nếu dữ liệu đã đổi trong lúc stream -> không lưu cache.
+        """
+        path = self.path(etag, encoding)
+        tmp = f"{path}.{os.getpid()}.{time.time_ns()}.tmp"
+        f = open(tmp, "wb")
+        try:
+            for out in encode_chunks(chunks, encoding):
+                f.write(out)
+                yield out
+            f.close()
+            if is_current is None or is_current():
+                os.replace(tmp, path)
+                self.prune()
+        finally:
+            # Client ngắt kết nối giữa chừng hoặc dữ liệu đã đổi -> bỏ file tạm
+            f.close()
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def build(self, etag, encoding, chunks, is_current=None):
+        """Writes the encoded export to the cache (used when a Range request misses it)."""
+        for _ in self.stream(etag, encoding, chunks, is_current):
+            pass
+        return self.get(etag, encoding)
+
+    def prune(self):
+        """Removes the files of all but the newest `keep` versions."""
+        versions = {}
+        for name in os.listdir(self.root):
+            if name.endswith(".tmp"):
+                continue
+            mtime = os.path.getmtime(os.path.join(self.root, name))
+            etag = name.split(".", 1)[0]
+            versions[etag] = max(versions.get(etag, 0), mtime)
+        for etag in sorted(versions, key=versions.get, reverse=True)[self.keep:]:
+            for name in os.listdir(self.root):
+                if name.startswith(f"{etag}.") and not name.endswith(".tmp"):
+                    try:
+                        os.remove(os.path.join(self.root, name))
+                    except FileNotFoundError:
+                        pass
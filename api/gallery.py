@@ -0,0 +1,166 @@
+import threading
+import uuid
+
+import numpy as np
+
+
+def l2_normalize(X):
+    """Chuẩn hoá L2 từng hàng, trả về ma trận float32 liên tục."""
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    return X / norms
+
+
+class EmbeddingGallery:
+    """
+    Nearest-neighbour recognizer over an L2-normalised float32 embedding gallery.
+    Each student is represented by its centroid plus up to top_k diverse exemplars;
+    a query is scored by cosine similarity (one matrix product over the gallery) and
+    the best student is rejected as unknown below a calibrated similarity threshold.
+    """
+    def __init__(self, top_k=8, far=0.01, min_threshold=0.3):
+        '''
+        Args:
+            top_k (int): Số exemplar tối đa giữ lại cho mỗi sinh viên (ngoài centroid).
+            far (float): Tỉ lệ chấp nhận nhầm (false accept rate) dùng để hiệu chỉnh ngưỡng.
+            min_threshold (float): Ngưỡng cosine tối thiểu khi không đủ dữ liệu để hiệu chỉnh.
+        '''
+        self.top_k = top_k
+        self.far = far
+        self.min_threshold = min_threshold
+        self.threshold = min_threshold
+        self._students = {}  # student_id -> (n_vectors, 512) normalised centroid + exemplars
+        self._lock = threading.Lock()
+        # Đổi mỗi khi index hoặc ngưỡng thay đổi (kiosk dùng để biết khi nào cần tải lại gallery)
+        self._instance = uuid.uuid4().hex[:12]
+        self._revision = 0
+        self.source = None        # etag của embedding store mà gallery đang phản ánh (from_store / add)
+        self.calibrated = False   # False sau add(): ngưỡng vẫn theo tập sinh viên cũ
+        # (matrix, starts, labels) được thay cả bộ một lần để truy vấn song song luôn nhất quán
+        self._index = (np.empty((0, 512), dtype=np.float32), np.empty(0, dtype=np.intp), np.empty(0, dtype=np.int64))
+
+    @classmethod
+    def from_frame(cls, df, **kwargs):
+        """Builds and calibrates a gallery from the embedding_data.csv layout (512 features + label)."""
+        gallery = cls(**kwargs)
+        X = df.iloc[:, :512].to_numpy(dtype=np.float32)
+        y = df.iloc[:, 512].to_numpy(dtype=np.int64)
+        gallery.fit(X, y)
+        return gallery
+
+    @classmethod
+    def from_store(cls, embedding_store, **kwargs):
+        """Builds and calibrates a gallery straight from the memory-mapped per-student shards."""
+        gallery = cls(**kwargs)
+        gallery.source = embedding_store.etag
+        shards = list(embedding_store.iter_shards())
+        with gallery._lock:
+            gallery._students = {student_id: gallery._summarize(X) for student_id, X in shards}
+            gallery._rebuild()
+        gallery.calibrate_shards(shards)
+        return gallery
+
+    def _summarize(self, X):
+        """Centroid + top_k exemplars chosen by farthest-point sampling on the unit sphere."""
+        X = l2_normalize(X)
+        centroid = l2_normalize(X.mean(axis=0, keepdims=True))
+        if len(X) <= self.top_k:
+            return np.vstack([centroid, X])
+        chosen = [int(np.argmax(X @ centroid[0]))]
+        nearest = X @ X[chosen[0]]
+        while len(chosen) < self.top_k:
+            idx = int(np.argmin(nearest))
+            chosen.append(idx)
+            nearest = np.maximum(nearest, X @ X[idx])
+        return np.vstack([centroid, X[chosen]])
+
+    def _rebuild(self):
+        ids = sorted(self._students)
+        blocks = [self._students[i] for i in ids]
+        sizes = [len(b) for b in blocks]
+        matrix = np.ascontiguousarray(np.vstack(blocks)) if blocks else np.empty((0, 512), dtype=np.float32)
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.intp) if blocks else np.empty(0, dtype=np.intp)
+        self._index = (matrix, starts, np.asarray(ids, dtype=np.int64))
+        self._revision += 1
+
+    def fit(self, X, y):
+        """Builds the gallery from all embeddings and calibrates the unknown threshold."""
+        with self._lock:
+            self._students = {int(label): self._summarize(X[y == label]) for label in np.unique(y)}
+            self._rebuild()
+        self.calibrate(X, y)
+
+    def add(self, student_id, X, source=None):
+        """Enrolls (or replaces) one student; takes effect for the next query without retraining.
+        The threshold is not recalibrated here (see `calibrated`); `source` is the etag of the
+        embedding store that now includes the student."""
+        summary = self._summarize(np.asarray(X, dtype=np.float32).reshape(-1, 512))
+        with self._lock:
+            self._students[int(student_id)] = summary
+            self._rebuild()
+            self.source = source
+            self.calibrated = False
+
+    def scores(self, X, index=None):
+        """Best cosine similarity per student, shape (N, n_students)."""
+        matrix, starts, _ = index or self._index
+        Q = l2_normalize(np.asarray(X, dtype=np.float32).reshape(-1, 512))
+        return np.maximum.reduceat(Q @ matrix.T, starts, axis=1)
+
+    def calibrate(self, X, y):
+        """Sets the threshold so that at most `far` of impostor best-scores are accepted."""
+        y = np.asarray(y, dtype=np.int64)
+        return self.calibrate_shards((label, X[y == label]) for label in np.unique(y))
+
+    def calibrate_shards(self, shards):
+        """Same as calibrate() for an iterable of (student_id, embeddings) pairs."""
+        # Đánh dấu trước khi đọc index: add() xảy ra trong lúc hiệu chỉnh sẽ đặt lại False
+        self.calibrated = True
+        index = self._index
+        labels = index[2]
+        if len(labels) < 2:
+            self.threshold = self.min_threshold
+            return self.threshold
+        impostors = []
+        for student_id, X in shards:
+            S = self.scores(X, index)
+            own = np.searchsorted(labels, int(student_id))
+            if own < len(labels) and labels[own] == int(student_id):
+                S[:, own] = -np.inf
+            impostors.append(S.max(axis=1))
+        impostor = np.concatenate(impostors)
+        self.threshold = max(self.min_threshold, float(np.quantile(impostor, 1.0 - self.far)))
+        self._revision += 1
+        return self.threshold
+
+    def predict(self, X):
+        """
+        Returns (student_ids, similarities) for each query; student_id is -1 when the best
+        similarity falls below the calibrated threshold.
+        """
+        index = self._index
+        if len(index[2]) == 0:
+            raise ValueError("Gallery chưa có dữ liệu sinh viên nào")
+        labels = index[2]
+        S = self.scores(X, index)
+        best = S.argmax(axis=1)
+        sims = S[np.arange(len(best)), best]
+        ids = np.where(sims >= self.threshold, labels[best], -1)
+        return ids, sims
+
+    @property
+    def version(self):
+        """Derived from the source embedding store and the threshold, so rebuilding the gallery from
+        unchanged data keeps the same version; galleries built from a frame use a per-instance tag."""
+        if self.source is not None:
+            return f"{self.source[:16]}-{int(round(self.threshold * 1e6))}"
+        return f"{self._instance}-{self._revision}"
+
+    def to_arrays(self):
+        """Index and threshold as plain NumPy arrays, enough to reproduce predict() elsewhere."""
+        matrix, starts, labels = self._index
+        return {"matrix": matrix, "starts": starts, "labels": labels, "threshold": np.asarray(self.threshold)}
+
+    def __len__(self):
+        return len(self._index[2])
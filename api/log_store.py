@@ -0,0 +1,340 @@
+"""
+Append-only attendance log made of immutable, time-partitioned CSV segments.
+
+    <root>/manifest.json                             {"columns", "segments": [...], "retired": [...]}
+    <root>/segments/<YYYYMMDD>-<time_ns>-<seq>.csv   one segment per append (or per compaction)
+    <root>/keys.jsonl                                idempotency keys of recent appends, one per line
+
+An append writes only the new rows as a new segment and then swaps the manifest. Readers stream
+the segments in manifest order. Compaction merges runs of small segments of the same day
+into one segment; replaced files are retired first and only deleted after a grace period,
+so streams that already read the manifest can still open them.
+An append may carry an idempotency key. Keys are kept for key_ttl_s in an in-memory dict that is
+loaded once from keys.jsonl (one appended line per key, rewritten without the expired keys during
+maintenance), so a retried append with the same key is an O(1) no-op.
+Publishing uploads only the segments the previous published version does not have yet.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+from artifact_store import ArtifactNotFound, BackgroundPublisher, link_or_copy
+
+LOG_COLUMNS = ["student_id", "student_name", "timestamp", "status"]
+MANIFEST = "manifest.json"
+KEYS = "keys.jsonl"
+
+
+def iter_segment_bytes(directory, columns, segments):
+    """Streams segments as one CSV: the header once, then each segment body (without its header) in order."""
+    yield (",".join(columns) + "\n").encode("utf-8")
+    for seg in segments:
+        with open(os.path.join(directory, seg["file"]), "rb") as f:
+            f.readline()
+            body = f.read()
+        if body and not body.endswith(b"\n"):
+            body += b"\n"
+        yield body
+
+
+def write_atomic(dest, chunks):
+    tmp = f"{dest}.tmp"
+    with open(tmp, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp, dest)
+    return dest
+
+
+class SegmentedLogStore:
+    def __init__(self, root="log_store", columns=LOG_COLUMNS, compact_min_segments=8,
+                 small_segment_rows=5000, retire_grace_s=600, key_ttl_s=7 * 86400):
+        '''
+        Args:
+            root (str): Thư mục chứa manifest và các segment.
+            columns (list): Cột của log, dùng khi chưa có manifest.
+            compact_min_segments (int): Số segment nhỏ liên tiếp (cùng ngày) tối thiểu để gộp.
+            small_segment_rows (int): Segment có ít hơn số dòng này được coi là nhỏ.
+            retire_grace_s (float): Thời gian giữ file đã bị gộp trước khi xoá.
+            key_ttl_s (float): Thời gian nhớ idempotency key của một lần append.
+        '''
+        self.root = root
+        self.segment_dir = os.path.join(root, "segments")
+        self.compact_min_segments = compact_min_segments
+        self.small_segment_rows = small_segment_rows
+        self.retire_grace_s = retire_grace_s
+        self.key_ttl_s = key_ttl_s
+        self._lock = threading.Lock()          # bảo vệ manifest
+        self._compact_lock = threading.Lock()  # chỉ một lần compaction tại một thời điểm
+        self._seq = 0
+        self._publisher = None
+        self.dirty = False  # có thay đổi chưa publish lên artifact store
+        self._published = None  # tên các segment của phiên bản đã publish gần nhất (None = chưa biết)
+        os.makedirs(self.segment_dir, exist_ok=True)
+        self.manifest = self._load_manifest(columns)
+        self._keys = self._load_keys()  # idempotency key -> entry của segment được append
+
+    # --- Manifest ---
+    def _load_manifest(self, columns):
+        try:
+            with open(os.path.join(self.root, MANIFEST), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"columns": list(columns), "segments": [], "retired": []}
+
+    def _save_manifest(self, manifest):
+        path = os.path.join(self.root, MANIFEST)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, path)
+        self.manifest = manifest
+
+    # --- Idempotency keys ---
+    def _load_keys(self):
+        keys = {}
+        # Manifest cũ lưu key trong từng segment: chuyển sang chỉ mục
+        for seg in self.manifest["segments"]:
+            for key in seg.pop("keys", ()):
+                keys[key] = {"file": seg["file"], "rows": seg["rows"], "created_at": seg["created_at"]}
+        try:
+            with open(os.path.join(self.root, KEYS), encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        item = json.loads(line)
+                        keys[item.pop("key")] = item
+        except FileNotFoundError:
+            pass
+        cutoff = time.time() - self.key_ttl_s
+        keys = {key: entry for key, entry in keys.items() if entry["created_at"] >= cutoff}
+        self._save_keys(keys)
+        return keys
+
+    def _save_keys(self, keys):
+        path = os.path.join(self.root, KEYS)
+        write_atomic(path, (json.dumps(dict(entry, key=key)).encode("utf-8") + b"\n" for key, entry in keys.items()))
+
+    def _expire_keys(self):
+        """Drops the keys older than key_ttl_s and rewrites keys.jsonl without them."""
+        cutoff = time.time() - self.key_ttl_s
+        with self._lock:
+            if any(entry["created_at"] < cutoff for entry in self._keys.values()):
+                self._keys = {key: entry for key, entry in self._keys.items() if entry["created_at"] >= cutoff}
+                self._save_keys(self._keys)
+
+    def segment_path(self, name):
+        return os.path.join(self.segment_dir, name)
+
+    def segments(self):
+        """Snapshot of the current segment list, in order."""
+        return list(self.manifest["segments"])
+
+    @property
+    def columns(self):
+        return self.manifest["columns"]
+
+    @property
+    def row_count(self):
+        return sum(seg["rows"] for seg in self.manifest["segments"])
+
+    def __len__(self):
+        return len(self.manifest["segments"])
+
+    # --- Write ---
+    def _new_segment_name(self, partition):
+        self._seq += 1
+        return f"{partition}-{time.time_ns()}-{self._seq:04d}.csv"
+
+    def _write_segment(self, df, partition):
+        name = self._new_segment_name(partition)
+        path = self.segment_path(name)
+        tmp = f"{path}.tmp"
+        df.to_csv(tmp, index=False, encoding="utf-8")
+        os.replace(tmp, path)
+        return name
+
+    def find_key(self, key):
+        """Returns the entry the append with idempotency key `key` was written as, or None."""
+        return self._keys.get(key)
+
+    def append(self, df, key=None):
+        """Writes `df` as a new immutable segment; the data written is proportional to the new rows,
+        plus the manifest swap (one entry per segment, kept short by compaction).
+        With an idempotency `key` that was already appended, nothing is written and the
+        existing entry is returned."""
+        extra = [c for c in df.columns if c not in self.columns]
+        if extra:
+            raise ValueError(f"Cột không có trong log: {extra}")
+        df = df.reindex(columns=self.columns)
+        if df.empty:
+            return None
+        existing = self.find_key(key) if key is not None else None
+        if existing is not None:
+            return existing
+        partition = time.strftime("%Y%m%d")
+        name = self._write_segment(df, partition)
+        entry = {"file": name, "partition": partition, "rows": len(df), "created_at": time.time()}
+        with self._lock:
+            if key is not None:
+                existing = self._keys.get(key)
+                if existing is not None:
+                    # Cùng key được gửi song song -> bỏ segment vừa ghi
+                    os.remove(self.segment_path(name))
+                    return existing
+            manifest = dict(self.manifest, segments=self.manifest["segments"] + [entry])
+            self._save_manifest(manifest)
+            if key is not None:
+                # Ghi key sau manifest: nếu dừng giữa chừng, lần gửi lại chỉ tạo trùng chứ không mất dữ liệu
+                self._keys[key] = {"file": name, "rows": len(df), "created_at": entry["created_at"]}
+                with open(os.path.join(self.root, KEYS), "a", encoding="utf-8") as f:
+                    f.write(json.dumps(dict(self._keys[key], key=key)) + "\n")
+            self.dirty = True
+        if self._publisher is not None:
+            self._publisher.wake()
+        return entry
+
+    def import_csv(self, path):
+        """Imports an existing log.csv (e.g. the legacy `log` artifact) as one segment."""
+        return self.append(pd.read_csv(path, encoding="utf-8"))
+
+    # --- Read ---
+    def iter_bytes(self, segments=None):
+        """Streams the whole log as one CSV: header once, then each segment body in order."""
+        segments = self.segments() if segments is None else segments
+        return iter_segment_bytes(self.segment_dir, self.columns, segments)
+
+    def write_csv(self, dest):
+        return write_atomic(dest, self.iter_bytes())
+
+    def read_frame(self):
+        frames = [pd.read_csv(self.segment_path(seg["file"]), encoding="utf-8") for seg in self.segments()]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=self.columns)
+
+    # --- Compaction ---
+    def _small_runs(self, segments):
+        """Yields (start, end) index ranges of consecutive small segments of the same partition."""
+        start = None
+        for i, seg in enumerate(segments + [None]):
+            small = seg is not None and seg["rows"] < self.small_segment_rows
+            same = start is not None and small and seg["partition"] == segments[start]["partition"]
+            if start is not None and not same:
+                if i - start >= self.compact_min_segments:
+                    yield start, i
+                start = None
+            if small and start is None:
+                start = i
+
+    def compact(self):
+        """Merges runs of small segments; returns the number of segments replaced."""
+        with self._compact_lock:
+            segments = self.segments()
+            replacements = []
+            for start, end in self._small_runs(segments):
+                run = segments[start:end]
+                name = self._new_segment_name(run[0]["partition"])
+                write_atomic(self.segment_path(name), self.iter_bytes(run))
+                entry = {"file": name, "partition": run[0]["partition"], "rows": sum(s["rows"] for s in run),
+                         "created_at": time.time()}
+                replacements.append((run, entry))
+
+            with self._lock:
+                current = self.manifest["segments"]
+                retired = list(self.manifest.get("retired", []))
+                for run, entry in replacements:
+                    # Các segment mới chỉ được nối vào cuối nên vị trí của run vẫn liên tục
+                    files = [s["file"] for s in run]
+                    idx = [s["file"] for s in current].index(files[0])
+                    current = current[:idx] + [entry] + current[idx + len(run):]
+                    retired += [{"file": f, "retired_at": time.time()} for f in files]
+                keep = []
+                for item in retired:
+                    if time.time() - item["retired_at"] > self.retire_grace_s:
+                        try:
+                            os.remove(self.segment_path(item["file"]))
+                        except FileNotFoundError:
+                            pass
+                    else:
+                        keep.append(item)
+                if replacements or len(keep) != len(self.manifest.get("retired", [])):
+                    self._save_manifest(dict(self.manifest, segments=current, retired=keep))
+                    if replacements:
+                        self.dirty = True
+            return sum(len(run) for run, _ in replacements)
+
+    # --- Artifact store ---
+    def publish(self, store, name="log_segments"):
+        """
+        Logs manifest + keys + segments as one artifact version. The first publish of the process logs
+        every segment; later ones only upload the segments the previous version does not have.
+        """
+        with self._lock:
+            manifest = self.manifest
+            keys = dict(self._keys)
+            self.dirty = False
+        files = [seg["file"] for seg in manifest["segments"]]
+        # Upload bản chụp manifest chứ không phải file đang sống: append/compact chạy song song có thể
+        # đã trỏ nó tới segment không nằm trong artifact
+        with tempfile.TemporaryDirectory(prefix=".publish-", dir=self.root) as scratch:
+            snapshot = os.path.join(scratch, MANIFEST)
+            with open(snapshot, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+            keys_snapshot = os.path.join(scratch, KEYS)
+            write_atomic(keys_snapshot, (json.dumps(dict(entry, key=key)).encode("utf-8") + b"\n"
+                                         for key, entry in keys.items()))
+            if self._published is None:
+                store.log_artifact(name, [self.segment_path(f) for f in files] + [snapshot, keys_snapshot], type="data")
+            else:
+                added = [self.segment_path(f) for f in files if f not in self._published]
+                removed = sorted(self._published - set(files))
+                store.update_artifact(name, added + [snapshot, keys_snapshot], remove=removed, type="data")
+        self._published = set(files)
+
+    def restore(self, directory):
+        """Initialises an empty store from a downloaded `log_segments` artifact directory."""
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+        for seg in manifest["segments"]:
+            dest = self.segment_path(seg["file"])
+            if not os.path.exists(dest):
+                link_or_copy(os.path.join(directory, seg["file"]), dest)
+        with self._lock:
+            self._save_manifest(dict(manifest, retired=[]))
+            if os.path.exists(os.path.join(directory, KEYS)):
+                shutil.copyfile(os.path.join(directory, KEYS), os.path.join(self.root, KEYS))
+            self._keys = self._load_keys()
+            # Đúng bằng phiên bản vừa tải về: lần publish sau chỉ upload phần mới
+            self._published = {seg["file"] for seg in self.manifest["segments"]}
+
+    # --- Background maintenance ---
+    def maintain(self):
+        self.compact()
+        self._expire_keys()
+
+    def start_background(self, store=None, interval_s=30.0):
+        """Starts a daemon thread that compacts and, when `store` is given, publishes changes."""
+        if self._publisher is None:
+            self._publisher = BackgroundPublisher(self, store, interval_s, name="log-store")
+        self._publisher.start()
+
+    def stop_background(self):
+        if self._publisher is not None:
+            self._publisher.stop()
+            self._publisher = None
+
+
+def fetch_log_csv(store, output_path, segments_name="attendance_face_recognition/log_segments:latest",
+                  legacy_name="attendance_face_recognition/log:latest"):
+    """Writes the full attendance log to output_path from the segmented artifact (or the legacy log.csv)."""
+    try:
+        directory = store.download(segments_name)
+    except ArtifactNotFound:
+        return store.fetch_file(legacy_name, "log.csv", output_path)
+    with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+        manifest = json.load(f)
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    return write_atomic(output_path, iter_segment_bytes(directory, manifest["columns"], manifest["segments"]))
@@ -1,49 +1,138 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile
-from pydantic import BaseModel, model_validator
+from fastapi import FastAPI, HTTPException, Request, Header
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError, model_validator
 from fastapi.responses import HTMLResponse
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import pandas as pd
-import joblib
+import numpy as np
 import os
-import json
-import wandb
-from fastapi.responses import StreamingResponse
 import io
+import json
+import threading
+import time
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from model_registry import ModelRegistry
+from gallery import EmbeddingGallery
+from batcher import MicroBatcher
+from artifact_store import ArtifactNotFound, get_store
+from log_store import SegmentedLogStore
+from embedding_store import EmbeddingStore
+from export_cache import ExportCache, etag_matches, negotiate_encoding
 
-# --- Init WandB ---
-run = wandb.init(project="attendance_face_recognition", job_type="api")
+# --- Init artifact store (ARTIFACT_STORE=wandb | local) ---
+store = get_store(job_type="api")
 
 # --- Config ---
 artifact_model_name = "attendance_face_recognition/model_export:latest"
-model_path = "model_export/model.pkl"
+model_cache_dir = os.environ.get("MODEL_CACHE_DIR", "model_cache")
 
 artifact_json_name = "attendance_face_recognition/students.json:latest"
 artifact_data_name = "attendance_face_recognition/embedding_data.csv:latest"
+artifact_shards_name = "attendance_face_recognition/embedding_shards:latest"
+artifact_log_name = "attendance_face_recognition/log:latest"
+artifact_log_segments_name = "attendance_face_recognition/log_segments:latest"
+
+# Append-only attendance log, compacted and published to the artifact store in the background
+log_store_dir = os.environ.get("LOG_STORE_DIR", "log_store")
+log_publish_interval_s = float(os.environ.get("LOG_PUBLISH_INTERVAL_S", 30))
+
+# One float32 .npy shard per student, published to the artifact store in the background
+embedding_store_dir = os.environ.get("EMBEDDING_STORE_DIR", "embedding_store")
+# Encoded /load_data downloads, one file per (version, encoding)
+export_cache_dir = os.environ.get("EXPORT_CACHE_DIR", "export_cache")
+
+# "forest": RandomForest từ artifact model_export, "gallery": so khớp cosine với embedding store
+recognition_mode = os.environ.get("RECOGNITION_MODE", "forest")
+gallery = None
+_calibration_lock = threading.Lock()
+
+# How often /recognizer checks the artifact store for a newer model / students.json
+recognizer_refresh_s = float(os.environ.get("RECOGNIZER_REFRESH_S", 30))
+
+# Micro-batching of concurrent /predict requests
+batch_max_size = int(os.environ.get("BATCH_MAX_SIZE", 32))
+batch_max_wait_ms = float(os.environ.get("BATCH_MAX_WAIT_MS", 2))
 
 # --- Init App ---
 app = FastAPI()
+registry = ModelRegistry(cache_dir=model_cache_dir)
+log_store = SegmentedLogStore(log_store_dir)
+embedding_store = EmbeddingStore(embedding_store_dir)
+export_cache = ExportCache(export_cache_dir)
 
 def load_model():
-    global model
-    model_export_path = run.use_artifact(artifact_model_name).download()
-    model = joblib.load(os.path.join(model_export_path, "model_export"))
-    print("-- Model loaded into memory. --")
+    global gallery
+    if recognition_mode == "gallery":
+        if gallery is not None and gallery.source == embedding_store.etag:
+            # Cùng dữ liệu: giữ gallery (và version) hiện tại, chỉ hiệu chỉnh lại nếu đã có đăng ký mới
+            return "recalibrated" if recalibrate_gallery() else "unchanged"
+        gallery = EmbeddingGallery.from_store(embedding_store)
+        print(f"-- Gallery of {len(gallery)} students loaded (threshold {gallery.threshold:.3f}). --")
+        return "loaded"
+    # Only resolves the artifact; download and joblib.load happen when the digest changed
+    artifact = store.use_artifact(artifact_model_name)
+    return registry.refresh(artifact)
+
+def recalibrate_gallery():
+    """Re-tunes the unknown threshold for the current population after live enrolments; returns True if it ran."""
+    with _calibration_lock:
+        current = gallery
+        if current is None or current.calibrated:
+            return False
+        current.calibrate_shards(embedding_store.iter_shards())
+        print(f"-- Gallery recalibrated for {len(current)} students (threshold {current.threshold:.3f}). --")
+        return True
+
+def init_log_store():
+    """Restores an empty local log from the segmented artifact, or imports the legacy log.csv once."""
+    if len(log_store):
+        return
+    try:
+        log_store.restore(store.download(artifact_log_segments_name))
+        print("-- Attendance log restored from log_segments. --")
+        return
+    except ArtifactNotFound:
+        pass
+    try:
+        legacy_log_file = os.path.join(store.download(artifact_log_name), "log.csv")
+        if os.path.exists(legacy_log_file):
+            log_store.import_csv(legacy_log_file)
+            print("-- Legacy log.csv imported into the log store. --")
+    except ArtifactNotFound:
+        pass
+
+def init_embedding_store():
+    """Restores an empty local store from the sharded artifact, or imports the legacy embedding_data.csv once."""
+    if len(embedding_store):
+        return
+    try:
+        embedding_store.restore(store.download(artifact_shards_name))
+        print("-- Embedding store restored from embedding_shards. --")
+        return
+    except ArtifactNotFound:
+        pass
+    try:
+        legacy_data_file = os.path.join(store.download(artifact_data_name), "embedding_data.csv")
+        if os.path.exists(legacy_data_file):
+            embedding_store.import_frame(pd.read_csv(legacy_data_file, encoding='utf-8'))
+            print("-- Legacy embedding_data.csv imported into the embedding store. --")
+    except ArtifactNotFound:
+        pass
 
 def load_json_data(artifact_json_name):
     global data_json
-    json_artifact_path = run.use_artifact(artifact_json_name).download()
+    json_artifact_path = store.download(artifact_json_name)
     json_file_path = os.path.join(json_artifact_path, "students.json")
     with open(json_file_path, 'r', encoding='utf-8') as f:
         data_json = json.load(f)
     print("-- JSON data loaded into memory. --")
     return data_json
 
-def load_data(artifact_data_name):
+def load_data():
     global data
-    data_artifact_path = run.use_artifact(artifact_data_name).download()
-    data_file_path = os.path.join(data_artifact_path, "embedding_data.csv")
-    data = pd.read_csv(data_file_path, encoding='utf-8')
-    print("-- CSV data loaded into memory. --")
+    # Memory-mapped shards, in the embedding_data.csv layout
+    data = embedding_store.to_frame()
+    print("-- Embedding data loaded into memory. --")
     return data
 
 # --- Pydantic Schema ---
@@ -64,15 +153,176 @@ class EmbeddingInput(BaseModel):
             }
         }
 
+class BatchEmbeddingInput(BaseModel):
+    embeddings: List[List[float]]
+
+    @model_validator(mode="before")
+    def check_length(cls, values):
+        embs = values.get("embeddings")
+        if not embs:
+            raise ValueError("‘embeddings’ phải chứa ít nhất 1 vector")
+        for i, emb in enumerate(embs):
+            if emb is None or len(emb) != 512:
+                raise ValueError(f"‘embeddings[{i}]’ phải có đúng 512 giá trị (đã nhận {len(emb) if emb is not None else 0})")
+        return values
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "embeddings": [[0.1] * 512, [0.2] * 512]  # Dummy example
+            }
+        }
+
+# --- Wire format ---
+# Raw little-endian float32 (or float16) rows of 512 values, selected with the X-Embedding-Dtype header
+BINARY_MEDIA_TYPE = "application/octet-stream"
+WIRE_DTYPES = {"float32": np.dtype("<f4"), "float16": np.dtype("<f2")}
+
+def decode_embeddings(body, dtype_name):
+    dtype = WIRE_DTYPES.get(dtype_name)
+    if dtype is None:
+        raise HTTPException(status_code=415, detail=f"X-Embedding-Dtype không hỗ trợ: {dtype_name} (chỉ {', '.join(WIRE_DTYPES)})")
+    row_bytes = 512 * dtype.itemsize
+    if len(body) == 0 or len(body) % row_bytes != 0:
+        raise HTTPException(status_code=422, detail=f"Body phải là bội số của {row_bytes} bytes (đã nhận {len(body)})")
+    # Zero-copy view over the request body
+    X = np.frombuffer(body, dtype=dtype).reshape(-1, 512)
+    if not np.isfinite(X).all():
+        raise HTTPException(status_code=422, detail="Embedding chứa giá trị NaN hoặc Inf")
+    return X
+
+async def read_embeddings(request, schema, field):
+    """Returns the (N, 512) embeddings of a binary body, falling back to the JSON schema."""
+    if request.headers.get("content-type", "").startswith(BINARY_MEDIA_TYPE):
+        return decode_embeddings(await request.body(), request.headers.get("x-embedding-dtype", "float32"))
+    try:
+        payload = schema.model_validate(await request.json())
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    except ValueError as e:
+        raise RequestValidationError([{"type": "json_invalid", "loc": ("body",), "msg": str(e), "input": None}])
+    return np.asarray(getattr(payload, field), dtype=np.float32).reshape(-1, 512)
+
+def embedding_body(schema):
+    """OpenAPI description of an endpoint accepting either JSON or binary embeddings."""
+    return {"requestBody": {"content": {
+        "application/json": {"schema": schema.model_json_schema()},
+        BINARY_MEDIA_TYPE: {"schema": {"type": "string", "format": "binary"}},
+    }, "required": True}}
+
+# --- Inference ---
+def predict_embeddings(embeddings):
+    """Run one vectorized predict_proba pass over an (N, 512) batch on the compiled forest.
+    Labels are taken from the same probabilities instead of a second predict call.
+    Returns a list of {"student_id", "confidence"} dicts in input order.
+    """
+    X = np.asarray(embeddings, dtype=np.float32).reshape(-1, 512)
+    if recognition_mode == "gallery":
+        ids, sims = gallery.predict(X)
+        # Khuôn mặt lạ (student_id -1) trả về confidence 0 để UI hiển thị "Unknown face"
+        return [
+            {"student_id": int(sid), "confidence": round(float(sim), 2) if sid != -1 else 0.0}
+            for sid, sim in zip(ids, sims)
+        ]
+    current = registry.current  # one read, so a concurrent hot-swap cannot mix two models
+    if current is None:
+        raise ValueError("Model chưa được load, hãy gọi /load_model trước")
+    engine = current.engine
+    proba = engine.predict_proba(X)
+    best = proba.argmax(axis=1)
+    preds = engine.classes_[best]
+    confs = proba[np.arange(len(best)), best]
+    return [
+        {"student_id": int(pred), "confidence": round(float(conf), 2)}
+        for pred, conf in zip(preds, confs)
+    ]
+
+batcher = MicroBatcher(predict_embeddings, max_batch_size=batch_max_size, max_wait_ms=batch_max_wait_ms)
+
+# --- Recognizer bundle for kiosks running inference locally ---
+_bundle_lock = threading.Lock()
+_bundle = (None, None)  # (version, npz bytes) của bundle được tạo gần nhất
+_students_digest = None
+_recognizer_checked_at = None  # time.monotonic() của lần kiểm tra artifact store gần nhất
+
+def recognizer_version():
+    """Returns (version, recognizer) where recognizer is the gallery or the LoadedModel being served.
+    At most every recognizer_refresh_s the artifact store is asked whether a newer model or
+    students.json was published; a new model is hot-swapped in the background by the registry.
+    The version changes whenever the model / gallery or the students artifact changes."""
+    global _students_digest, _recognizer_checked_at
+    now = time.monotonic()
+    if _recognizer_checked_at is None or now - _recognizer_checked_at >= recognizer_refresh_s:
+        # Gallery: chỉ dựng lại khi embedding store đổi, hoặc hiệu chỉnh lại sau khi đăng ký
+        load_model()
+        _students_digest = store.use_artifact(artifact_json_name).digest
+        _recognizer_checked_at = now
+    if recognition_mode == "gallery":
+        recognizer, tag = gallery, gallery.version
+    else:
+        recognizer = registry.current  # one read, so the version and the arrays come from the same model
+        tag = recognizer.digest[:16]
+    return f"{recognition_mode}-{tag}-{_students_digest[:16]}", recognizer
+
+def recognizer_bundle(version, recognizer):
+    """Returns (version, npz bytes) of `recognizer` together with students.json; only rebuilt for a new version."""
+    global _bundle
+    with _bundle_lock:
+        if _bundle[0] == version:
+            return _bundle
+        arrays = recognizer.to_arrays() if recognition_mode == "gallery" else recognizer.engine.to_arrays()
+        buffer = io.BytesIO()
+        students = json.dumps(load_json_data(artifact_json_name), ensure_ascii=False)
+        np.savez_compressed(buffer, kind=np.asarray(recognition_mode), students=np.asarray(students), **arrays)
+        _bundle = (version, buffer.getvalue())
+        return _bundle
+
 # --- Endpoints ---
+@app.on_event("startup")
+async def start_batcher():
+    batcher.start()
+
+@app.on_event("startup")
+def start_log_store():
+    try:
+        init_log_store()
+    except Exception as e:
+        print(f"-- Could not restore the attendance log: {e} --")
+    log_store.start_background(store, interval_s=log_publish_interval_s)
+
+@app.on_event("startup")
+def start_embedding_store():
+    try:
+        init_embedding_store()
+    except Exception as e:
+        print(f"-- Could not restore the embedding store: {e} --")
+    embedding_store.start_background(store, interval_s=log_publish_interval_s)
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    await batcher.stop()
+
+@app.on_event("shutdown")
+def stop_log_store():
+    log_store.stop_background()
+
+@app.on_event("shutdown")
+def stop_embedding_store():
+    embedding_store.stop_background()
+
 @app.get("/", response_class=HTMLResponse)
 async def root():
     return "<h1>Facial Recognition API</h1><p>Ready to predict 512-dim embeddings.</p>"
 
 @app.post("/load_model")
 def load_latest_model():
-    load_model()
-    return {"message": "Model loaded successfully."}
+    status = load_model()
+    current = registry.current
+    return {
+        "message": "Model loaded successfully.",
+        "status": status,
+        "version": current.version if current else None,
+    }
 
 @app.get("/load_json_data")
 def load_latest_json():
@@ -80,27 +330,40 @@ def load_latest_json():
     return students
 
 @app.get("/load_data")
-def load_latest_data():
-    data = load_data(artifact_data_name)
-    stream = io.StringIO()
-    data.to_csv(stream, index=False)
-    stream.seek(0)
-    return StreamingResponse(stream, media_type="text/csv", headers={"Content-Disposition": "attachment; filename=embedding_data.csv"})
+def load_latest_data(request: Request):
+    etag = embedding_store.etag
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    headers = {
+        "ETag": f'"{etag}"' if encoding == "identity" else f'"{etag}-{encoding}"',
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "no-cache",
+        "Content-Disposition": "attachment; filename=embedding_data.csv",
+    }
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    # The client already holds this version
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    def is_current():
+        return embedding_store.etag == etag
+
+    path = export_cache.get(etag, encoding)
+    if path is None and request.headers.get("range"):
+        path = export_cache.build(etag, encoding, embedding_store.iter_csv(), is_current)
+    if path is not None:
+        # Served from disk: Range / If-Range are handled by FileResponse
+        return FileResponse(path, media_type="text/csv", headers=headers)
+    # First download of this version: stream the shards chunk by chunk and keep a copy for the next ones
+    stream = export_cache.stream(etag, encoding, embedding_store.iter_csv(), is_current)
+    return StreamingResponse(stream, media_type="text/csv", headers=headers)
 
 @app.get("/load_log")
 def load_log():
-    # Check if artifact exists
-    artifact_name = "attendance_face_recognition/log:latest"
-    try:
-        latest_artifact = run.use_artifact(artifact_name)
-        latest_log_path = latest_artifact.download()
-        latest_log_file = os.path.join(latest_log_path, "log.csv")
-        if os.path.exists(latest_log_file):
-            return StreamingResponse(open(latest_log_file, mode="rb"), media_type="text/csv", headers={"Content-Disposition": "attachment; filename=log.csv"})
-        else:
-            raise HTTPException(status_code=404, detail="Log file not found.")
-    except wandb.errors.CommError:
-        raise HTTPException(status_code=404, detail="Artifact not found.")
+    if log_store.row_count == 0:
+        raise HTTPException(status_code=404, detail="Log file not found.")
+    # Streams the segments of the current manifest in order
+    return StreamingResponse(log_store.iter_bytes(), media_type="text/csv", headers={"Content-Disposition": "attachment; filename=log.csv"})
 
 @app.post("/save_json")
 async def save_json(students: dict):
@@ -108,12 +371,10 @@ async def save_json(students: dict):
         latest_json = load_json_data(artifact_json_name)
         # Merge new data with existing data
         latest_json.update(students)
-        # Save the updated data back to the JSON file and upload it to W&B
-        artifact = wandb.Artifact(name="students.json", type="data")
+        # Save the updated data back to the JSON file and upload it to the artifact store
         with open("students.json", "w", encoding='utf-8') as f:
             json.dump(latest_json, f, ensure_ascii=False, indent=4)
-        artifact.add_file("students.json")
-        run.log_artifact(artifact)
+        store.log_artifact("students.json", ["students.json"], type="data")
         os.remove("students.json")
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -121,55 +382,70 @@ async def save_json(students: dict):
 @app.post("/save_data")
 async def save_data(data: Dict[int, List[float]]):
     try:
-        latest_data = load_data(artifact_data_name)
         df = pd.DataFrame(data)
-        merge_data = pd.concat([df, latest_data], ignore_index=True)
-        # Save the updated data back to the CSV file and upload it to W&B
-        artifact = wandb.Artifact(name="embedding_data.csv", type="data")
-        merge_data.to_csv("embedding_data.csv", index=False, encoding='utf-8')
-        artifact.add_file("embedding_data.csv")
-        run.log_artifact(artifact)
-        os.remove("embedding_data.csv")
+        rows_before = embedding_store.row_count
+        # Only the enrolled students' shards are written; upload happens in the background
+        for student_id, rows in df.groupby(df.columns[512]):
+            embedding_store.put(student_id, rows.iloc[:, :512].to_numpy(dtype=np.float32))
+            # Enrolment takes effect immediately in gallery mode, without waiting for a retrain
+            if gallery is not None:
+                gallery.add(student_id, embedding_store.load(student_id), source=embedding_store.etag)
+        if gallery is not None:
+            # Ngưỡng "unknown" theo tập sinh viên mới, hiệu chỉnh ở background
+            threading.Thread(target=recalibrate_gallery, name="gallery-calibration", daemon=True).start()
+        return {"message": "Data saved successfully.", "rows_before": rows_before, "rows_after": embedding_store.row_count}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/save_log")
-async def save_file_log(log: Dict[str, List[Any]]):
+async def save_file_log(log: Dict[str, List[Any]], idempotency_key: Optional[str] = Header(None)):
     try:
-        # Save log to a local file
+        # Kiosk gửi lại cùng một batch (Idempotency-Key) sau khi mất kết nối -> không ghi lần hai
+        if idempotency_key and log_store.find_key(idempotency_key) is not None:
+            return {"message": "Log already saved.", "rows": 0, "duplicate": True, "total_rows": log_store.row_count}
         df = pd.DataFrame(log)
-        # Upload log file as a W&B artifact
-        # Check if artifact exists
-        artifact_name = "attendance_face_recognition/log:latest"
-        try:
-            latest_artifact = run.use_artifact(artifact_name)
-            latest_log_path = latest_artifact.download()
-            latest_log_file = os.path.join(latest_log_path, "log.csv")
-            if os.path.exists(latest_log_file):
-                latest_df = pd.read_csv(latest_log_file, encoding='utf-8')
-                df = pd.concat([latest_df, df], ignore_index=True)
-                df.to_csv("log.csv", index=False, encoding='utf-8')
-                artifact = wandb.Artifact(name="log", type="data")
-                artifact.add_file("log.csv")
-                run.log_artifact(artifact)
-                # os.remove("log.csv")
-        except wandb.errors.CommError:
-            # Artifact does not exist, proceed to create new
-            artifact = wandb.Artifact(name="log", type="data")
-            df.to_csv("log.csv", index=False, encoding='utf-8')
-            artifact.add_file("log.csv")
-            run.log_artifact(artifact)
-            # os.remove("log.csv")
-        return {"message": "Log saved and uploaded to W&B successfully."}
+        # Only the new rows are written, as a new segment; upload happens in the background
+        log_store.append(df, key=idempotency_key)
+        return {"message": "Log saved successfully.", "rows": len(df), "total_rows": log_store.row_count}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/predict", openapi_extra=embedding_body(EmbeddingInput))
+async def predict_student(request: Request):
+    embeddings = await read_embeddings(request, EmbeddingInput, "embedding")
+    if len(embeddings) != 1:
+        raise HTTPException(status_code=422, detail=f"/predict nhận đúng 1 embedding (đã nhận {len(embeddings)})")
+    try:
+        return await batcher.submit(embeddings[0])
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.post("/predict")
-async def predict_student(input: EmbeddingInput):
+@app.post("/predict_batch", openapi_extra=embedding_body(BatchEmbeddingInput))
+async def predict_batch(request: Request):
+    embeddings = await read_embeddings(request, BatchEmbeddingInput, "embeddings")
     try:
-        df = pd.DataFrame([input.embedding])
-        pred = model.predict(df)[0]
-        conf = max(model.predict_proba(df)[0])
-        return {"student_id": int(pred), "confidence": round(conf, 2)}
+        # Inference thread của batcher: batch lớn không chặn event loop (và các request /predict khác)
+        return {"predictions": await batcher.run(embeddings)}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/recognizer")
+def load_recognizer(request: Request):
+    """Recognizer (compiled forest or gallery) + students.json as one .npz, for on-kiosk inference."""
+    try:
+        version, recognizer = recognizer_version()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"ETag": f'"{version}"', "X-Recognizer-Version": version, "Cache-Control": "no-cache"}
+    # The kiosk already holds this version: answer before any array is serialised
+    if etag_matches(request.headers.get("if-none-match"), version):
+        return Response(status_code=304, headers=headers)
+    try:
+        version, body = recognizer_bundle(version, recognizer)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(body, media_type=BINARY_MEDIA_TYPE, headers=headers)
+
+@app.get("/metrics")
+def batcher_metrics():
+    return batcher.metrics()
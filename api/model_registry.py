@@ -0,0 +1,83 @@
+import os
+import shutil
+import threading
+from typing import Any, NamedTuple
+
+import joblib
+
+from tree_engine import CompiledForest
+
+
+class LoadedModel(NamedTuple):
+    version: str
+    digest: str
+    model: Any
+    engine: CompiledForest
+
+
+class ModelRegistry:
+    """
+    Local model registry keyed by artifact digest.
+    Each artifact version is downloaded once into cache_dir/<digest>/ and only deserialised
+    when its digest differs from the model in memory. New versions are loaded in a background
+    thread and published with a single reference swap, so in-flight predictions always see
+    either the old or the new model, never a half-loaded one.
+    """
+    def __init__(self, cache_dir="model_cache", filename="model_export"):
+        '''
+        Args:
+            cache_dir (str): Thư mục lưu các phiên bản model đã tải về.
+            filename (str): Tên file model bên trong artifact.
+        '''
+        self.cache_dir = cache_dir
+        self.filename = filename
+        self.current = None  # LoadedModel đang phục vụ dự đoán
+        self.loading = None  # digest đang được tải ở background
+        self._lock = threading.Lock()
+
+    def refresh(self, artifact, block=False):
+        """Makes `artifact` the served model if its digest changed.
+        Args:
+            artifact (wandb.Artifact): Artifact model đã resolve (chưa download).
+            block (bool): Chờ load xong thay vì chạy ở background. Luôn chờ khi chưa có model nào.
+        Returns:
+            str: "unchanged", "loading" hoặc "loaded".
+        """
+        digest = artifact.digest
+        with self._lock:
+            if self.current is not None and self.current.digest == digest:
+                return "unchanged"
+            if self.loading == digest:
+                return "loading"
+            self.loading = digest
+
+        if block or self.current is None:
+            self._load(artifact)
+            return "loaded"
+        threading.Thread(target=self._load, args=(artifact,), name=f"load-model-{artifact.version}", daemon=True).start()
+        return "loading"
+
+    def _download(self, artifact):
+        """Downloads the artifact into the cache once; a partial download is never visible."""
+        target = os.path.join(self.cache_dir, artifact.digest)
+        if not os.path.exists(os.path.join(target, self.filename)):
+            partial = target + ".partial"
+            shutil.rmtree(partial, ignore_errors=True)
+            artifact.download(root=partial)
+            shutil.rmtree(target, ignore_errors=True)
+            os.replace(partial, target)
+        return os.path.join(target, self.filename)
+
+    def _load(self, artifact):
+        try:
+            model = joblib.load(self._download(artifact))
+            loaded = LoadedModel(artifact.version, artifact.digest, model, CompiledForest.from_sklearn(model))
+            self.current = loaded  # atomic swap
+            print(f"-- Model {artifact.version} ({artifact.digest[:8]}) loaded into memory. --")
+        except Exception as e:
+            print(f"-- Failed to load model {artifact.version}: {e} --")
+            raise
+        finally:
+            with self._lock:
+                if self.loading == artifact.digest:
+                    self.loading = None
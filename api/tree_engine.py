@@ -0,0 +1,110 @@
+import numpy as np
+
+
+class CompiledForest:
+    """
+    Array-backed inference engine for a fitted sklearn RandomForestClassifier.
+    All trees are flattened into a single set of NumPy node arrays so a whole batch
+    is evaluated level by level with vectorized gathers, without sklearn's per-call
+    validation, threading or any pandas conversion.
+    """
+    def __init__(self, feature, threshold, left, right, leaf_proba, roots, depth, classes):
+        '''
+        Args:
+            feature (np.ndarray): Chỉ số feature được so sánh tại mỗi node (0 với node lá).
+            threshold (np.ndarray): Ngưỡng so sánh tại mỗi node (+inf với node lá).
+            left, right (np.ndarray): Chỉ số node con trái/phải; node lá trỏ về chính nó.
+            leaf_proba (np.ndarray): Phân phối lớp (đã chuẩn hoá) của mỗi node, shape (n_nodes, n_classes).
+            roots (np.ndarray): Chỉ số node gốc của từng cây.
+            depth (int): Độ sâu lớn nhất trong các cây.
+            classes (np.ndarray): Nhãn lớp theo thứ tự cột của leaf_proba.
+        '''
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.leaf_proba = leaf_proba
+        self.roots = roots
+        self.depth = depth
+        self.classes_ = classes
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Flattens every estimator of a fitted RandomForestClassifier into shared node arrays.
+        Args:
+            model (RandomForestClassifier): Mô hình đã huấn luyện (ví dụ từ artifact model_export).
+        Returns:
+            CompiledForest: Engine có cùng kết quả predict_proba với mô hình gốc.
+        """
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("CompiledForest chỉ hỗ trợ mô hình một đầu ra (n_outputs_ == 1)")
+
+        features, thresholds, lefts, rights, probas, roots = [], [], [], [], [], []
+        depth = 0
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            is_leaf = tree.children_left == -1
+            node_ids = np.arange(n_nodes)
+
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.intp))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+
+            # Chuẩn hoá phân phối lớp giống DecisionTreeClassifier.predict_proba
+            value = tree.value[:, 0, :].astype(np.float64)
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            probas.append(value / normalizer)
+
+            roots.append(offset)
+            depth = max(depth, tree.max_depth)
+            offset += n_nodes
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            leaf_proba=np.ascontiguousarray(np.concatenate(probas)),
+            roots=np.asarray(roots, dtype=np.intp),
+            depth=depth,
+            classes=model.classes_,
+        )
+
+    ARRAYS = ("feature", "threshold", "left", "right", "leaf_proba", "roots")
+
+    def to_arrays(self):
+        """Plain NumPy arrays of the engine (e.g. for np.savez), restored with from_arrays()."""
+        arrays = {name: getattr(self, name) for name in self.ARRAYS}
+        arrays["depth"] = np.asarray(self.depth)
+        arrays["classes"] = np.asarray(self.classes_)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        kwargs = {name: np.asarray(arrays[name]) for name in cls.ARRAYS}
+        return cls(depth=int(arrays["depth"]), classes=np.asarray(arrays["classes"]), **kwargs)
+
+    def apply(self, X):
+        """Returns the leaf reached by every (tree, sample) pair, shape (n_trees, N)."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        rows = np.arange(X.shape[0])[np.newaxis, :]
+        nodes = np.repeat(self.roots[:, np.newaxis], X.shape[0], axis=1)
+        for _ in range(self.depth):
+            # sklearn so sánh giá trị float32 với ngưỡng float64: X <= threshold -> nhánh trái
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_proba(self, X):
+        """Averages the leaf class distributions of all trees, shape (N, n_classes)."""
+        leaves = self.apply(X)
+        return self.leaf_proba[leaves].mean(axis=0)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
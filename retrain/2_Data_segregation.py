@@ -2,9 +2,13 @@ import logging
 import tempfile
 import pandas as pd
 import os
-import wandb
+import sys
 from sklearn.model_selection import train_test_split
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+from artifact_store import ArtifactNotFound, get_store
+from embedding_store import load_frame
+
 
 # =========================================================================================================
 # 2. Data_segregation 
@@ -16,8 +20,9 @@ test_size = 0.20
 seed = 42
 # reference (column) to stratify the data
 stratify = "512"
-# name of the input artifact
-artifact_input_name = "attendance_face_recognition/embedding_data.csv:latest"
+# name of the input artifact (per-student float32 shards), and the legacy CSV used as a fallback
+artifact_input_name = "attendance_face_recognition/embedding_shards:latest"
+artifact_legacy_name = "attendance_face_recognition/embedding_data.csv:latest"
 # type of the artifact
 artifact_type = "segregated_data"
 # configure logging
@@ -28,13 +33,17 @@ logging.basicConfig(level=logging.INFO,
 # reference for a logging obj
 logger = logging.getLogger()
 
-# initiate wandb project
-run = wandb.init(project="attendance_face_recognition", job_type="split_data")
+# initiate the artifact store (ARTIFACT_STORE=wandb | local)
+store = get_store(job_type="split_data")
 
 logger.info("Downloading and reading artifact")
-artifact = run.use_artifact(artifact_input_name)
-artifact_dir = artifact.download()  # Lưu toàn bộ files về local
-df = pd.read_csv(os.path.join(artifact_dir, "embedding_data.csv")) 
+try:
+    artifact_dir = store.download(artifact_input_name)  # Lưu toàn bộ files về local
+    df = load_frame(artifact_dir)
+except ArtifactNotFound:
+    logger.info("No embedding_shards artifact, reading the legacy embedding_data.csv")
+    artifact_dir = store.download(artifact_legacy_name)
+    df = pd.read_csv(os.path.join(artifact_dir, "embedding_data.csv")) 
 
 # Split firstly in train/test, then we further divide the dataset to train and validation
 logger.info("Splitting data into train and test")
@@ -58,25 +67,21 @@ with tempfile.TemporaryDirectory() as tmp_dir:
 
         logger.info(f"Uploading the {split} dataset to {artifact_name}")
 
-        # Save then upload to W&B
+        # Save then upload to the artifact store
         df.to_csv(temp_path,index=False)
 
-        artifact = wandb.Artifact(name=artifact_name,
-                                  type=artifact_type,
-                                  description=f"{split} split of dataset {artifact_input_name}",
-        )
-        artifact.add_file(temp_path)
-
         logger.info("Logging artifact")
-        run.log_artifact(artifact)
-
-        # This waits for the artifact to be uploaded to W&B. If you
-        # do not add this, the temp directory might be removed before
+        # wait=True waits for the artifact to be uploaded. If you
+        # do not wait, the temp directory might be removed before
         # W&B had a chance to upload the datasets, and the upload
         # might fail
-        artifact.wait()
+        store.log_artifact(artifact_name,
+                           [temp_path],
+                           type=artifact_type,
+                           description=f"{split} split of dataset {artifact_input_name}",
+                           wait=True)
 
 # close the run
 # waiting a while after run the previous cell before execute this
-run.finish() 
+store.finish() 
 
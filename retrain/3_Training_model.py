@@ -7,6 +7,10 @@ from sklearn.metrics import accuracy_score
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+from artifact_store import get_store
 
 # =========================================================================================================
 # 3. Training_model  
@@ -29,12 +33,11 @@ logging.basicConfig(level=logging.INFO,
 # reference for a logging obj
 logger = logging.getLogger()
 
-# initiate the wandb project
-run = wandb.init(project="attendance_face_recognition",job_type="train")
+# initiate the artifact store (ARTIFACT_STORE=wandb | local); sweeps below still use W&B
+store = get_store(job_type="train")
 
 logger.info("Downloading and reading train artifact")
-artifact = run.use_artifact(artifact_input_name)
-artifact_dir = artifact.download()  # Lưu toàn bộ files về local
+artifact_dir = store.download(artifact_input_name)  # Lưu toàn bộ files về local
 
 df_train = pd.read_csv(os.path.join(artifact_dir, "train.csv"))
 
@@ -143,15 +146,13 @@ logger.info("Dumping the artifacts to disk")
 joblib.dump(model, artifact_model)
 
 # Model artifact
-artifact = wandb.Artifact(artifact_model,
-                          type=artifact_type,
-                          description="Best Random Forest model"
-                          )
-
 logger.info("Logging model artifact")
-artifact.add_file(artifact_model)
-run.log_artifact(artifact)
+store.log_artifact(artifact_model,
+                   [artifact_model],
+                   type=artifact_type,
+                   description="Best Random Forest model"
+                   )
 
-run.finish() 
+store.finish() 
 
 
@@ -1,10 +1,13 @@
 import logging
 import pandas as pd
-import wandb
 import joblib
 from sklearn.metrics import accuracy_score
 from sklearn.metrics import classification_report
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+from artifact_store import get_store
 
 # =========================================================================================================
 # 4. Testing  
@@ -20,12 +23,11 @@ logging.basicConfig(level=logging.INFO,
 
 # reference for a logging obj
 logger = logging.getLogger()
-# initiate the wandb project
-run = wandb.init(project="attendance_face_recognition",job_type="test") 
+# initiate the artifact store (ARTIFACT_STORE=wandb | local)
+store = get_store(job_type="test")
 
 logger.info("Downloading and reading test artifact")
-artifact = run.use_artifact(artifact_test_name)
-test_data_path = artifact.download()  # Lưu toàn bộ files về local
+test_data_path = store.download(artifact_test_name)  # Lưu toàn bộ files về local
 df_test = pd.read_csv(os.path.join(test_data_path, "test.csv"))
 
 # Extract the target from the features
@@ -35,7 +37,7 @@ y_test = x_test.pop("512")
 
 # Download inference artifact
 logger.info("Downloading and load the exported model")
-model_export_path = run.use_artifact(artifact_model_name).download()
+model_export_path = store.download(artifact_model_name)
 model = joblib.load(os.path.join(model_export_path, "model_export")) 
 
 # predict
@@ -48,8 +50,10 @@ acc = accuracy_score(y_test, predict)
 
 logger.info("Test Accuracy: {}".format(acc))
 
-run.summary["Acc"] = acc
+# The local store has no W&B run to attach the summary to
+if store.run is not None:
+    store.run.summary["Acc"] = acc
 
 print(classification_report(y_test,predict))
 
-run.finish() 
+store.finish() 
@@ -1,7 +1,18 @@
 # Define the __all__ variable
-__all__ = ["utils", "feature_engineering","preprocessing"]
+__all__ = ["utils", "feature_engineering","preprocessing", "video_pipeline", "inference_backend"]
 
-# Import the submodules
-from . import utils
-from . import feature_engineering
-from . import preprocessing
\ No newline at end of file
+# Import the submodules lazily: `import src` stays cheap, and matplotlib / TensorFlow are only
+# loaded when the submodule that needs them is first accessed (src.utils, src.feature_engineering)
+import importlib
+
+
+def __getattr__(name):
+    if name in __all__:
+        module = importlib.import_module(f".{name}", __name__)
+        globals()[name] = module
+        return module
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
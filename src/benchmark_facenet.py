@@ -0,0 +1,158 @@
+"""
+Latency, memory and agreement benchmark of the FaceNet inference backends against the Keras model.
+
+Face crops come from the images in data/test and from every `--frame-interval`-th frame of the
+videos in data/videos (rotated to portrait, largest face). For each backend the script reports the
+load time (including the one-off TFLite conversion), the process RSS growth, the mean latency per
+batch and the cosine similarity of its embeddings with the Keras embeddings of the same crops.
+
+Usage (from the repository root):
+    python -m src.benchmark_facenet --backends keras,tflite-fp16,tflite-int8 --batch-sizes 1,8,32
+"""
+import argparse
+import gc
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from src import inference_backend
+from src.feature_engineering import FaceEmbedding
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def rss_mb():
+    """Current resident set size; falls back to the peak RSS when psutil is not installed."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2**20
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def rotate_to_portrait(frame):
+    height, width = frame.shape[:2]
+    return cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE) if width > height else frame
+
+
+def load_crops(embedder, image_dir, video_dir, frame_interval=15, max_frames=60):
+    """Returns (crops, sources): 160x160 RGB face crops from the test images and the enrolment videos."""
+    crops, sources = [], []
+
+    def add(frame, source):
+        face = embedder.largest_face(frame)
+        if face is not None:
+            crops.append(embedder.face_crop(frame, face))
+            sources.append(source)
+
+    for path in sorted(glob.glob(os.path.join(image_dir, "*.jpg")) + glob.glob(os.path.join(image_dir, "*.png"))):
+        img = cv2.imread(path)
+        if img is not None:
+            add(img, "image")
+    for path in sorted(set(glob.glob(os.path.join(video_dir, "*.mov")) + glob.glob(os.path.join(video_dir, "*.MOV")))):
+        cap = cv2.VideoCapture(path)
+        frame_count = kept = 0
+        while kept < max_frames:
+            if frame_count % frame_interval:
+                if not cap.grab():
+                    break
+            else:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                add(rotate_to_portrait(frame), "video")
+                kept += 1
+            frame_count += 1
+        cap.release()
+    return crops, np.array(sources)
+
+
+def time_batches(embedder, crops, batch_size, repeat):
+    """Mean milliseconds per call of embed_batch on `batch_size` crops."""
+    batch = crops[:batch_size]
+    embedder.embed_batch(batch, batch_size)  # warm-up (cấp phát tensor, khởi tạo graph)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        embedder.embed_batch(batch, batch_size)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def cosine_rows(A, B):
+    A = A / np.linalg.norm(A, axis=1, keepdims=True)
+    B = B / np.linalg.norm(B, axis=1, keepdims=True)
+    return (A * B).sum(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default=",".join(inference_backend.BACKENDS), help="Comma separated backends")
+    parser.add_argument("--images", default=os.path.join("data", "test"), help="Directory of test images")
+    parser.add_argument("--videos", default=os.path.join("data", "videos"), help="Directory of enrolment videos")
+    parser.add_argument("--frame-interval", type=int, default=15, help="Use every n-th video frame")
+    parser.add_argument("--max-frames", type=int, default=60, help="Frames read per video")
+    parser.add_argument("--batch-sizes", default="1,8,32", help="Comma separated batch sizes")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed calls per batch size")
+    parser.add_argument("--cache-dir", help="TFLite cache directory (default FACENET_CACHE_DIR)")
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="Exit 1 if the mean cosine agreement is lower")
+    args = parser.parse_args()
+    if args.cache_dir:
+        os.environ["FACENET_CACHE_DIR"] = args.cache_dir
+
+    backends = [inference_backend.resolve_backend(b) for b in args.backends.split(",")]
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    base_rss = rss_mb()
+    start = time.perf_counter()
+    reference = FaceEmbedding(backend="keras")
+    keras_load_s = time.perf_counter() - start
+    keras_rss = rss_mb() - base_rss
+    crops, sources = load_crops(reference, args.images, args.videos, args.frame_interval, args.max_frames)
+    if not crops:
+        print("Không tìm thấy khuôn mặt nào trong dữ liệu benchmark.")
+        sys.exit(1)
+    print(f"{len(crops)} face crops: {(sources == 'image').sum()} from {args.images}, "
+          f"{(sources == 'video').sum()} from {args.videos}")
+    expected = reference.embed_batch(crops)
+
+    header = f"{'backend':>12} {'load (s)':>9} {'+RSS (MB)':>10}"
+    header += "".join(f" {f'b={b} (ms)':>11}" for b in batch_sizes)
+    header += f" {'cos mean':>9} {'cos min':>8} {'top-1':>6}"
+    print(header)
+
+    ok = True
+    for backend in backends:
+        if backend == "keras":
+            embedder, load_s, extra_rss = reference, keras_load_s, keras_rss
+        else:
+            gc.collect()
+            before = rss_mb()
+            start = time.perf_counter()
+            embedder = FaceEmbedding(backend=backend)
+            load_s = time.perf_counter() - start
+            extra_rss = rss_mb() - before
+        latencies = [time_batches(embedder, crops, b, args.repeat) for b in batch_sizes]
+        embeddings = embedder.embed_batch(crops)
+        cos = cosine_rows(expected, embeddings)
+        # Khuôn mặt gần nhất trong tập tham chiếu có trùng với chính nó không
+        top1 = float(np.mean((embeddings @ expected.T).argmax(axis=1) == np.arange(len(crops))))
+        ok &= bool(cos.mean() >= args.min_cosine)
+
+        row = f"{backend:>12} {load_s:>9.2f} {extra_rss:>10.1f}"
+        row += "".join(f" {ms:>11.2f}" for ms in latencies)
+        row += f" {cos.mean():>9.4f} {cos.min():>8.4f} {top1:>6.2f}"
+        print(row)
+        if embedder is not reference:
+            del embedder
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
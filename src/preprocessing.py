@@ -1,8 +1,8 @@
 import cv2
 import os
 import glob
-import pandas as pd
 from src import feature_engineering as fe
+from src.video_pipeline import EmbeddingBuffer, VideoEmbeddingPipeline
 
 class Processing_Img():
     def __init__(self, video_dir, student):
@@ -26,14 +26,26 @@ class Processing_Img():
             frame = cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
         return frame
 
-    def frame_to_vector(self, interval=5):
+    def frame_to_vector(self, interval=5, cancel=None, sampler=None):
         """
         Đọc tất cả các tệp video trong thư mục video_dir và trích xuất khung hình và xử lý nó từ mỗi video.
         Embedding các frame đã xử lý đó thành các vector d-512
         Args:
+            interval (int): Chỉ xử lý 1 trên `interval` khung hình.
+            cancel (threading.Event): Đặt để dừng xử lý giữa chừng.
+            sampler (FrameSampler): Bỏ khung hình mờ / trùng lặp và giới hạn số khuôn mặt mỗi sinh viên.
         Returns: DataFrame chứa các vector d-512, student_id và student_name cho mỗi khung hình đã xử lý.
         """
+        return self.frame_to_buffer(interval, cancel, sampler).to_frame()
+
+    def frame_to_buffer(self, interval=5, cancel=None, sampler=None):
+        """
+        Giống frame_to_vector nhưng trả về EmbeddingBuffer (ma trận float32 (N, 512) + mảng student_id),
+        không tạo DataFrame.
+        """
         embedder = fe.FaceEmbedding()
+        # decode -> phát hiện/cắt khuôn mặt song song -> embedding theo batch
+        pipeline = VideoEmbeddingPipeline(embedder, transform=self.rotate_to_portrait, sampler=sampler)
 
         # Lấy danh sách tất cả tệp MOV trong thư mục video
         video_files = glob.glob(os.path.join(self.video_dir, "*.mov"))
@@ -42,8 +54,7 @@ class Processing_Img():
             print("Không tìm thấy tệp MOV nào trong thư mục:", self.video_dir)
             exit()
         
-        df = pd.DataFrame(columns=range(513))  # 512 cho embedding + 1 cho student_id
-        index = 0
+        buffer = EmbeddingBuffer()  # 512 cho embedding + 1 cho student_id
         
         # Lặp qua từng tệp video
         for video_file in video_files:
@@ -53,50 +64,27 @@ class Processing_Img():
                 print(f"Tên file không đúng định dạng [mã sv]_[tên sv]: {filename}")
                 continue
             student_id, student_name = filename.split("_", 1)
+            if not student_id.isdecimal():
+                # Nhãn embedding là số nguyên: bỏ qua video này thay vì dừng cả lần chạy
+                print(f"Mã sinh viên phải là số, bỏ qua: {filename}")
+                continue
             
             if student_id in self.student:
                 continue  # Bỏ qua video nếu student_id đã có trong danh sách student
             
-            # Tạo đối tượng VideoCapture để đọc video
-            cap = cv2.VideoCapture(video_file)
-            
-            # Kiểm tra xem video có được mở thành công không
-            if not cap.isOpened():
-                print(f"Lỗi: Không thể mở video {video_file}")
+            print(f"Đang xử lý video {video_file}")
+            try:
+                embeddings = pipeline.run(video_file, interval=interval, cancel=cancel)
+            except IOError as e:
+                print(f"Lỗi: {e}")
                 continue
-            
-            # In thông tin FPS của video gốc
-            actual_fps = cap.get(cv2.CAP_PROP_FPS)
-            print(f"Đang xử lý video {video_file} (FPS gốc: {actual_fps})")
-            
-            # Khởi tạo biến đếm cho khung hình
-            frame_count = 0
-            
-            # Duyệt qua các khung hình
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    print(f"Hết video hoặc lỗi khi đọc khung hình tại {video_file}")
-                    break
-                
-                if frame_count % interval == 0:
-                    # Trích xuất khung hình tại khoảng thời gian nhất định
-                    # Xoay khung hình để đảm bảo định dạng dọc
-                    frame = self.rotate_to_portrait(frame)
-                    embedding = embedder.embedding_face(frame)  # Trích xuất embedding cho khuôn mặt
-                    if embedding is None:
-                        frame_count += 1
-                        continue
-                    embedding = pd.Series(embedding)
-                    embedding = pd.concat([embedding, pd.Series([student_id])], ignore_index=True)
-                    df.loc[index] = embedding
-                    index += 1
-                frame_count += 1
-            
-            # Giải phóng đối tượng VideoCapture
-            cap.release()
+            if embeddings is None:
+                print("Đã huỷ xử lý video.")
+                return buffer
+
+            buffer.extend(embeddings, int(student_id))
             # In thông báo kết quả cho video hiện tại
             print(f"Đã trích xuất khung hình từ video của sinh viên {student_id} - {student_name}")
             self.student[student_id] = student_name  # Thêm student_id và student_name vào dictionary
         print("Hoàn tất xử lý tất cả video.")
-        return df
\ No newline at end of file
+        return buffer
\ No newline at end of file
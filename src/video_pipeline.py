@@ -0,0 +1,296 @@
+import collections
+import concurrent.futures
+import queue
+import threading
+
+import cv2
+import numpy as np
+import pandas as pd
+
+_END = object()
+
+
+class EmbeddingBuffer:
+    """
+    Growable columnar result: a float32 (N, 512) embedding matrix and an int64 label array.
+    Capacity doubles when full, so appending N rows costs O(N) amortised.
+    """
+    def __init__(self, capacity=256, dim=512):
+        self._X = np.empty((capacity, dim), dtype=np.float32)
+        self._y = np.empty(capacity, dtype=np.int64)
+        self._n = 0
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def embeddings(self):
+        return self._X[:self._n]
+
+    @property
+    def labels(self):
+        return self._y[:self._n]
+
+    def _reserve(self, n):
+        if n <= len(self._X):
+            return
+        capacity = max(n, 2 * len(self._X))
+        X = np.empty((capacity, self._X.shape[1]), dtype=np.float32)
+        y = np.empty(capacity, dtype=np.int64)
+        X[:self._n] = self._X[:self._n]
+        y[:self._n] = self._y[:self._n]
+        self._X, self._y = X, y
+
+    def extend(self, X, labels):
+        """Appends the rows of X; `labels` is one label for all rows or one per row."""
+        X = np.asarray(X, dtype=np.float32).reshape(-1, self._X.shape[1])
+        end = self._n + len(X)
+        self._reserve(end)
+        self._X[self._n:end] = X
+        self._y[self._n:end] = labels
+        self._n = end
+
+    def to_frame(self):
+        """DataFrame in the embedding_data.csv layout (columns 0..511 + 512 = student_id)."""
+        df = pd.DataFrame(self.embeddings)
+        df[self._X.shape[1]] = self.labels
+        return df
+
+
+class FrameSampler:
+    """
+    Chooses which frames of an enrolment video reach FaceNet.
+
+    - Stride: with a target number of frames and a known frame count, only about
+      `target_frames * oversample` frames are decoded; the others are skipped with grab()
+      (or a seek when the stride is at least `seek_stride`).
+    - Detection runs on a copy downscaled to `detect_width`; the crop is taken at full resolution.
+    - A face crop is dropped when it is blurry (variance of Laplacian < min_sharpness) or nearly
+      identical to the last kept crop (cosine similarity of 16x16 thumbnails > max_similarity).
+    - Decoding stops once `target_frames` crops are kept.
+    """
+    def __init__(self, target_frames=60, oversample=3, detect_width=320, min_sharpness=30.0,
+                 max_similarity=0.98, seek_stride=None):
+        '''
+        Args:
+            target_frames (int): Số khuôn mặt khác nhau cần lấy cho mỗi sinh viên (None = không giới hạn).
+            oversample (int): Số khung hình được decode cho mỗi khuôn mặt cần lấy (bù cho các khung bị loại).
+            detect_width (int): Chiều rộng ảnh dùng để phát hiện khuôn mặt (None = không thu nhỏ).
+            min_sharpness (float): Ngưỡng độ nét tối thiểu của khuôn mặt.
+            max_similarity (float): Khuôn mặt giống khuôn mặt vừa giữ hơn ngưỡng này thì bị bỏ.
+            seek_stride (int): Bước nhảy tối thiểu để seek thay vì grab() (None = luôn grab()).
+        '''
+        self.target_frames = target_frames
+        self.oversample = oversample
+        self.detect_width = detect_width
+        self.min_sharpness = min_sharpness
+        self.max_similarity = max_similarity
+        self.seek_stride = seek_stride
+
+    def stride(self, interval, frame_count):
+        if not self.target_frames or frame_count <= 0:
+            return interval
+        return max(interval, int(frame_count) // (self.target_frames * self.oversample))
+
+    def detection_scale(self, frame):
+        if not self.detect_width or frame.shape[1] <= self.detect_width:
+            return 1.0
+        return self.detect_width / frame.shape[1]
+
+    def quality(self, crop):
+        """Returns (sharpness, thumbnail signature) of an RGB face crop."""
+        gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+        sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+        thumb = cv2.resize(gray, (16, 16), interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+        thumb -= thumb.mean()
+        norm = np.linalg.norm(thumb)
+        return sharpness, thumb / norm if norm > 0 else thumb
+
+    def accept(self, quality, last_signature):
+        sharpness, signature = quality
+        if sharpness < self.min_sharpness:
+            return False
+        return last_signature is None or float(signature @ last_signature) <= self.max_similarity
+
+
+class VideoEmbeddingPipeline:
+    """
+    Multi-stage pipeline for turning an enrolment video into face embeddings:
+
+        decode thread  ->  bounded queue  ->  detection/crop pool  ->  batched FaceNet stage
+
+    The decode thread decodes every `interval`-th frame (skipped frames are only grab()bed),
+    a thread pool runs the transform + Haar detection + crop (OpenCV releases the GIL), and the
+    calling thread groups the crops into batches for FaceNet. Queues are bounded, so a slow stage
+    blocks the ones before it instead of buffering the whole video. Output order is the frame order.
+    With a FrameSampler, blurry / near-duplicate crops are dropped before FaceNet.
+    """
+    def __init__(self, embedder, transform=None, detect_workers=4, batch_size=32, queue_size=64, sampler=None):
+        '''
+        Args:
+            embedder (FaceEmbedding): Bộ phát hiện + embedding khuôn mặt.
+            transform (callable): Hàm áp dụng lên mỗi khung hình trước khi phát hiện (vd. xoay dọc).
+            detect_workers (int): Số luồng phát hiện/cắt khuôn mặt.
+            batch_size (int): Số khuôn mặt mỗi lần gọi FaceNet.
+            queue_size (int): Số khung hình tối đa nằm chờ giữa các stage (backpressure).
+            sampler (FrameSampler): Chế độ lấy mẫu thông minh (None = lấy mọi khung hình thứ `interval`).
+        '''
+        self.embedder = embedder
+        self.transform = transform
+        self.detect_workers = detect_workers
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.sampler = sampler
+        self._local = threading.local()
+
+    def _decode(self, video_path, interval, frames, stop, state):
+        """Decode stage: puts every `interval`-th frame into `frames`, then _END.
+        state["total"] is set to the expected number of decoded frames (0 if unknown)."""
+        cap = cv2.VideoCapture(video_path)
+        try:
+            if not cap.isOpened():
+                raise IOError(f"Không thể mở video {video_path}")
+            stride = interval
+            seek = False
+            if self.sampler is not None:
+                stride = self.sampler.stride(interval, cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                seek = self.sampler.seek_stride is not None and stride >= self.sampler.seek_stride
+            state["total"] = -(-int(max(cap.get(cv2.CAP_PROP_FRAME_COUNT), 0)) // stride)
+            frame_count = 0
+            while not stop.is_set():
+                if frame_count % stride == 0:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    self._put(frames, frame, stop)
+                    frame_count += 1
+                elif seek:
+                    frame_count += stride - frame_count % stride
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_count)
+                else:
+                    # grab() không giải mã khung hình -> rẻ hơn nhiều so với read()
+                    if not cap.grab():
+                        break
+                    frame_count += 1
+        except Exception as e:
+            self._put(frames, e, stop)
+        finally:
+            cap.release()
+            self._put(frames, _END, stop)
+
+    @staticmethod
+    def _put(q, item, stop):
+        # put() có timeout để luồng decode không bị kẹt mãi khi pipeline bị huỷ
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _crop(self, frame):
+        """Detection stage: transform, detect the largest face and crop it.
+        Returns (crop, quality) or None if no face; quality is None without a sampler."""
+        cascade = getattr(self._local, "cascade", None)
+        if cascade is None:
+            # CascadeClassifier không an toàn khi dùng chung giữa các luồng
+            cascade = self._local.cascade = self.embedder.new_cascade()
+        if self.transform is not None:
+            frame = self.transform(frame)
+        if self.sampler is None:
+            face = self.embedder.largest_face(frame, cascade)
+            if face is None:
+                return None
+            return self.embedder.face_crop(frame, face), None
+
+        # Phát hiện trên ảnh thu nhỏ, cắt trên ảnh gốc
+        scale = self.sampler.detection_scale(frame)
+        small = frame if scale == 1.0 else cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        face = self.embedder.largest_face(small, cascade)
+        if face is None:
+            return None
+        face = tuple(int(round(v / scale)) for v in face)
+        crop = self.embedder.face_crop(frame, face)
+        return crop, self.sampler.quality(crop)
+
+    def run(self, video_path, interval=5, cancel=None, progress=None):
+        """
+        Chạy pipeline trên một video.
+        Args:
+            video_path (str): Đường dẫn video.
+            interval (int): Chỉ xử lý 1 trên `interval` khung hình.
+            cancel (threading.Event): Đặt để huỷ giữa chừng.
+            progress (callable): progress(done, total) sau mỗi khung hình đã phát hiện xong
+                (total = số khung hình dự kiến, 0 nếu không biết).
+        Returns:
+            np.ndarray: Ma trận (N, 512) float32 theo thứ tự khung hình, hoặc None nếu bị huỷ.
+        """
+        cancel = cancel or threading.Event()
+        stop = threading.Event()
+        frames = queue.Queue(maxsize=self.queue_size)
+        state = {"total": 0, "done": 0}
+        decoder = threading.Thread(target=self._decode, args=(video_path, interval, frames, stop, state),
+                                   name="video-decode", daemon=True)
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.detect_workers, thread_name_prefix="face-detect")
+        pending = collections.deque()
+        crops, chunks = [], []
+        kept = 0
+        last_signature = None
+        target = self.sampler.target_frames if self.sampler is not None else None
+
+        def flush():
+            if crops:
+                chunks.append(self.embedder.embed_batch(crops, self.batch_size))
+                crops.clear()
+
+        def collect(block):
+            # Lấy kết quả theo đúng thứ tự khung hình
+            nonlocal kept, last_signature
+            while pending and (block or pending[0].done()) and not (target and kept >= target):
+                result = pending.popleft().result()
+                block = False
+                state["done"] += 1
+                if progress is not None:
+                    progress(state["done"], state["total"])
+                if result is None:
+                    continue
+                crop, quality = result
+                if quality is not None:
+                    if not self.sampler.accept(quality, last_signature):
+                        continue
+                    last_signature = quality[1]
+                crops.append(crop)
+                kept += 1
+                if len(crops) >= self.batch_size:
+                    flush()
+
+        decoder.start()
+        try:
+            while not cancel.is_set() and not (target and kept >= target):
+                try:
+                    item = frames.get(timeout=0.1)
+                except queue.Empty:
+                    collect(block=False)
+                    continue
+                if item is _END:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                pending.append(pool.submit(self._crop, item))
+                collect(block=len(pending) >= self.queue_size)
+            if cancel.is_set():
+                return None
+            while pending and not (target and kept >= target):
+                collect(block=True)
+            flush()
+            if progress is not None:
+                progress(max(state["done"], state["total"]), max(state["done"], state["total"]))
+        finally:
+            stop.set()
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=True)
+            decoder.join()
+        if not chunks:
+            return np.empty((0, 512), dtype=np.float32)
+        return np.concatenate(chunks)
@@ -14,21 +14,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize WandB only when needed
-wandb_run = None
+# Initialize the artifact store only when needed
+store = None
 
 @app.get("/api/refresh-data")
 async def refresh_data():
-    """Refresh attendance data by downloading the latest log from WandB"""
-    global wandb_run
+    """Refresh attendance data by downloading the latest log from the artifact store"""
+    global store
     
     try:
-        # Initialize WandB connection if not already done
-        if wandb_run is None:
-            wandb_run = wandb_client.init_wandb()
+        # Initialize the artifact store if not already done
+        if store is None:
+            store = wandb_client.init_store()
         
         # Download and overwrite the local log file
-        output_path = wandb_client.download_latest_log(wandb_run)
+        output_path = wandb_client.download_latest_log(store)
         
         return {"status": "success", "message": "Data refreshed successfully", "file_path": output_path}
     except HTTPException as http_ex:
@@ -38,7 +38,7 @@ async def refresh_data():
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Cleanup WandB resources on shutdown"""
-    global wandb_run
-    if wandb_run:
-        wandb_run.finish()
\ No newline at end of file
+    """Cleanup artifact store resources on shutdown"""
+    global store
+    if store:
+        store.finish()
\ No newline at end of file
@@ -1,4 +1,5 @@
 import os
+import sys
 import wandb
 from fastapi import HTTPException
 from fastapi.responses import StreamingResponse
@@ -7,36 +8,25 @@ from dotenv import load_dotenv
 load_dotenv() 
 wandb_api_key = os.environ.get('WANDB_API_KEY') 
 
-def init_wandb():
-    """Initialize WandB connection"""
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "api"))
+from artifact_store import ArtifactNotFound, get_store
+from log_store import fetch_log_csv
+
+def init_store():
+    """Initialize the artifact store (ARTIFACT_STORE=wandb | local)"""
     try:
-        wandb.login(key=wandb_api_key) 
-        run = wandb.init(project="attendance_face_recognition", job_type="api")
-        return run
+        if os.environ.get('ARTIFACT_STORE', 'wandb') == 'wandb':
+            wandb.login(key=wandb_api_key) 
+        return get_store(job_type="api")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to connect to WandB: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to connect to artifact store: {str(e)}")
 
-def download_latest_log(run, output_path='data/attendance_log.csv'):
-    """Download the latest log file from WandB and overwrite the local file"""
-    artifact_name = "attendance_face_recognition/log:latest"
-    
+def download_latest_log(store, output_path='data/attendance_log.csv'):
+    """Download the latest log file from the artifact store and overwrite the local file"""
     try:
-        latest_artifact = run.use_artifact(artifact_name)
-        latest_log_path = latest_artifact.download()
-        latest_log_file = os.path.join(latest_log_path, "log.csv")
-        
-        if os.path.exists(latest_log_file):
-            # Ensure the data directory exists
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            
-            # Copy the file content to overwrite the existing file
-            with open(latest_log_file, 'rb') as source, open(output_path, 'wb') as dest:
-                dest.write(source.read())
-                
-            return output_path
-        else:
-            raise HTTPException(status_code=404, detail="Log file not found in artifact.")
-    except wandb.errors.CommError as e:
+        # Merges the log_segments artifact (or copies the legacy log.csv) and overwrites the file atomically
+        return fetch_log_csv(store, output_path)
+    except ArtifactNotFound as e:
         raise HTTPException(status_code=404, detail=f"Artifact not found: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error downloading log: {str(e)}")
\ No newline at end of file
@@ -7,9 +7,14 @@ from datetime import datetime
 from config import Config
 import wandb
 import shutil
+import sys
 from pathlib import Path 
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+from artifact_store import get_store
+from log_store import fetch_log_csv
+
 load_dotenv() 
 wandb_api_key = os.environ.get('WANDB_API_KEY') 
 
@@ -20,38 +25,23 @@ app.config.from_object(Config)
 os.makedirs(os.path.dirname(Config.DATA_FILE_PATH), exist_ok=True)
 
 
-# Thêm hàm kết nối WandB
-def init_wandb():
-    """Initialize WandB connection"""
+# Thêm hàm kết nối artifact store (ARTIFACT_STORE=wandb | local)
+def init_store():
+    """Initialize the artifact store (WandB by default)"""
     try:
-        wandb.login(key=wandb_api_key)
-        run = wandb.init(project="attendance_face_recognition", job_type="api")
-        return run
+        if os.environ.get('ARTIFACT_STORE', 'wandb') == 'wandb':
+            wandb.login(key=wandb_api_key)
+        return get_store(job_type="api")
     except Exception as e:
-        print(f"Failed to connect to WandB: {str(e)}")
+        print(f"Failed to connect to artifact store: {str(e)}")
         return None
 
-# Thêm hàm tải tệp WandB
-def download_latest_log(run, output_path=Config.DATA_FILE_PATH):
-    """Download the latest log file from WandB"""
-    artifact_name = "attendance_face_recognition/log:latest"
-    
+# Thêm hàm tải tệp log từ artifact store
+def download_latest_log(store, output_path=Config.DATA_FILE_PATH):
+    """Download the latest log file from the artifact store"""
     try:
-        latest_artifact = run.use_artifact(artifact_name)
-        latest_log_path = latest_artifact.download()
-        latest_log_file = os.path.join(latest_log_path, "log.csv")
-        
-        if os.path.exists(latest_log_file):
-            # Ensure the data directory exists
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            
-            # Copy the file content to overwrite the existing file
-            with open(latest_log_file, 'rb') as source, open(output_path, 'wb') as dest:
-                dest.write(source.read())
-                
-            return output_path
-        else:
-            return None
+        # Merges the log_segments artifact (or copies the legacy log.csv) and overwrites the file atomically
+        return fetch_log_csv(store, output_path)
     except Exception as e:
         print(f"Error downloading log: {str(e)}")
         return None
@@ -59,18 +49,18 @@ def download_latest_log(run, output_path=Config.DATA_FILE_PATH):
 # Sửa lại hàm refresh_data() trong app.py
 @app.route('/api/refresh', methods=['POST'])
 def refresh_data():
-    """API endpoint to trigger data refresh directly from WandB"""
+    """API endpoint to trigger data refresh directly from the artifact store"""
     try:
-        # Khởi tạo WandB và tải file
-        wandb_run = init_wandb()
-        if not wandb_run:
+        # Khởi tạo artifact store và tải file
+        store = init_store()
+        if not store:
             return jsonify({
                 'status': 'error',
-                'message': "Failed to connect to WandB"
+                'message': "Failed to connect to artifact store"
             }), 500
             
-        output_path = download_latest_log(wandb_run)
-        wandb_run.finish()  # Đóng kết nối WandB
+        output_path = download_latest_log(store)
+        store.finish()  # Đóng kết nối WandB
         
         if output_path:
             return jsonify({